@@ -3,26 +3,66 @@ SDN QoS 策略管理系统 - Flask Web 应用
 Flask Web Application for SDN QoS Policy Management
 """
 
-from flask import Flask, request, jsonify, send_from_directory, render_template_string
+from flask import Flask, Response, request, jsonify, send_from_directory
+from flask.json.provider import JSONProvider
+from werkzeug.exceptions import HTTPException
 from werkzeug.utils import secure_filename
+import orjson
 import os
-from pathlib import Path
 from datetime import datetime
+from collections import OrderedDict
+import copy
+import hashlib
+import itertools
+import re
+import tempfile
+import threading
 import traceback
 
 from config import Config
-from core.engine import PolicyEngine
+from core.engine import engine
 from core.deployer import NXAPIClient
 from core.models import PolicyStatus
 from utils.logger import setup_logger, get_operation_logger
 
+class OrjsonProvider(JSONProvider):
+    """基于 orjson 的 JSON 序列化（C 实现，替代 Flask 默认的 json 模块）"""
+    
+    option = orjson.OPT_NON_STR_KEYS
+    
+    @staticmethod
+    def _default(obj):
+        """orjson 不支持的类型"""
+        if isinstance(obj, (set, frozenset)):
+            return list(obj)
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self._default, option=self.option).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        """直接使用 orjson 输出的 bytes 构建响应，省去一次解码"""
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self._default, option=self.option)
+        return self._app.response_class(body, mimetype='application/json')
+
+
 # 初始化应用
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.config.from_object(Config)
+# 由 Werkzeug 在解析 multipart 之前拒绝超大请求
+app.config['MAX_CONTENT_LENGTH'] = Config.MAX_UPLOAD_SIZE
 
 # 初始化目录
 Config.init_directories()
 
+# 共享的 NX-API 客户端（复用会话与连接池）
+switch_client = NXAPIClient(**Config.get_switch_config())
+
 # 初始化日志
 logger = setup_logger(
     name='sdn_qos',
@@ -34,12 +74,141 @@ op_logger = get_operation_logger()
 
 # 内存存储策略（生产环境应使用数据库）
 policies_storage = {}
+# 策略 ID 按创建时间升序排列（不可变元组，写入时整体替换，读取方无需加锁）
+policies_storage_order = ()
+_storage_lock = threading.Lock()
+
+# 上传验证失败时最多返回的错误条数
+MAX_VALIDATION_ERRORS = 20
+
+# 允许的上传文件扩展名（预编译）
+_ALLOWED_EXT_RE = re.compile(
+    r'\.(?:' + '|'.join(map(re.escape, sorted(Config.ALLOWED_EXTENSIONS))) + r')\Z',
+    re.IGNORECASE
+)
+
+# 预先序列化的静态响应体
+_ALLOWED_EXT_ERROR_BODY = orjson.dumps({
+    'success': False,
+    'error': f'File type not allowed. Allowed: {sorted(Config.ALLOWED_EXTENSIONS)}'
+})
+_CONFIG_BODY = orjson.dumps({
+    'switch_ip': Config.SWITCH_IP,
+    'switch_port': Config.SWITCH_PORT,
+    'dry_run_mode': Config.DRY_RUN,
+    'environment': Config.FLASK_ENV
+})
+
+# 日志尾部读取的块大小
+TAIL_BLOCK_SIZE = 1 << 16
+
+# 解析结果的 LRU 缓存（按内容哈希索引）
+PARSE_CACHE_SIZE = 256
+_parse_cache = OrderedDict()      # sha1(文件内容) -> 已验证的 PolicyModel
+_cache_lock = threading.Lock()
+
+
+def _cache_get(cache, key):
+    """从 LRU 缓存读取，命中时移到队尾"""
+    with _cache_lock:
+        if key not in cache:
+            return None
+        cache.move_to_end(key)
+        return cache[key]
+
+
+def _cache_put(cache, key, value, max_size):
+    """写入 LRU 缓存，超出容量时淘汰最久未使用的项"""
+    with _cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
+
+
+def save_file_atomic(filepath, content):
+    """先写临时文件再原子替换，避免并发上传读到半写的文件"""
+    fd, tmp_path = tempfile.mkstemp(dir=str(filepath.parent), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def store_policy(policy):
+    """保存策略并维护创建顺序（同 ID 重新上传时移到最新）"""
+    global policies_storage_order
+    with _storage_lock:
+        policies_storage[policy.id] = policy
+        policies_storage_order = tuple(
+            pid for pid in policies_storage_order if pid != policy.id
+        ) + (policy.id,)
+
+
+def remove_policy(policy_id):
+    """删除策略，返回是否存在"""
+    global policies_storage_order
+    with _storage_lock:
+        if policies_storage.pop(policy_id, None) is None:
+            return False
+        policies_storage_order = tuple(
+            pid for pid in policies_storage_order if pid != policy_id
+        )
+        return True
+
+
+def upload_success_response(policy, saved_filename):
+    """记录上传与验证成功日志，返回上传成功响应（解析缓存命中与否共用）"""
+    op_logger.log_upload(policy.id, saved_filename, True)
+    op_logger.log_validation(policy.id, True, 0)
+    
+    return jsonify({
+        'success': True,
+        'message': 'Policy uploaded and validated successfully',
+        'policy_id': policy.id,
+        'policy': policy.to_dict()
+    })
+
+
+def tail_lines(filepath, n, block_size=TAIL_BLOCK_SIZE):
+    """
+    读取文件最后 n 行（从文件末尾向前分块读取，不加载整个文件）
+    
+    Args:
+        filepath: 文件路径
+        n: 行数
+        block_size: 每次向前读取的字节数
+        
+    Returns:
+        最后 n 行（bytes，不含换行符）
+    """
+    if n <= 0:
+        return []
+    
+    with open(filepath, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END)
+        blocks = []
+        newlines = 0
+        
+        # 多读一个换行符，保证第一行完整
+        while pos > 0 and newlines <= n:
+            read_size = min(block_size, pos)
+            pos -= read_size
+            f.seek(pos)
+            block = f.read(read_size)
+            newlines += block.count(b'\n')
+            blocks.append(block)
+    
+    data = b''.join(reversed(blocks))
+    return data.splitlines()[-n:]
 
 
 def allowed_file(filename):
     """检查文件扩展名是否允许"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
+    return _ALLOWED_EXT_RE.search(filename) is not None
 
 
 @app.route('/')
@@ -87,25 +256,19 @@ def health_check():
 @app.route('/api/config', methods=['GET'])
 def get_config():
     """获取配置信息（脱敏）"""
-    return jsonify({
-        'switch_ip': Config.SWITCH_IP,
-        'switch_port': Config.SWITCH_PORT,
-        'dry_run_mode': Config.DRY_RUN,
-        'environment': Config.FLASK_ENV
-    })
+    return Response(_CONFIG_BODY, mimetype='application/json')
 
 
 @app.route('/api/policies', methods=['GET'])
 def get_policies():
     """获取策略列表"""
     try:
+        # 按创建时间倒序（对顺序快照迭代，期间的删除只会导致跳过）
         policies_list = []
-        
-        for policy_id, policy in policies_storage.items():
-            policies_list.append(policy.to_dict())
-        
-        # 按创建时间倒序
-        policies_list.sort(key=lambda x: x['created_at'], reverse=True)
+        for policy_id in reversed(policies_storage_order):
+            policy = policies_storage.get(policy_id)
+            if policy is not None:
+                policies_list.append(policy.to_dict())
         
         return jsonify({
             'success': True,
@@ -150,6 +313,13 @@ def get_policy(policy_id):
 def upload_policy():
     """上传策略文件"""
     try:
+        # 先按 Content-Length 拒绝超大上传，避免读取请求体
+        if request.content_length and request.content_length > Config.MAX_UPLOAD_SIZE:
+            return jsonify({
+                'success': False,
+                'error': f'File too large. Max size: {Config.MAX_UPLOAD_SIZE} bytes'
+            }), 413
+        
         # 检查文件
         if 'file' not in request.files:
             return jsonify({
@@ -166,52 +336,58 @@ def upload_policy():
             }), 400
         
         if not allowed_file(file.filename):
-            return jsonify({
-                'success': False,
-                'error': f'File type not allowed. Allowed: {Config.ALLOWED_EXTENSIONS}'
-            }), 400
+            return Response(_ALLOWED_EXT_ERROR_BODY, 400, mimetype='application/json')
+        
+        # 读取内容（大小已受 MAX_UPLOAD_SIZE 限制）
+        content = file.stream.read()
+        content_hash = hashlib.sha1(content).hexdigest()
         
-        # 保存文件
+        # 按内容哈希命名，相同内容重复上传不再写盘
         filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        saved_filename = f"{timestamp}_{filename}"
+        saved_filename = f"{content_hash[:16]}_{filename}"
         filepath = Config.POLICIES_UPLOADED_DIR / saved_filename
         
-        file.save(str(filepath))
-        logger.info(f"Policy file uploaded: {saved_filename}")
+        if not filepath.exists():
+            save_file_atomic(filepath, content)
+            logger.info(f"Policy file uploaded: {saved_filename}")
+        else:
+            logger.info(f"Policy file unchanged: {saved_filename}")
+        
+        # 相同内容已解析并验证过，直接复用
+        cached = _cache_get(_parse_cache, content_hash)
+        if cached is not None:
+            policy = copy.deepcopy(cached)
+            policy.created_at = policy.updated_at = datetime.now()
+            store_policy(policy)
+            return upload_success_response(policy, saved_filename)
         
         # 解析策略
-        engine = PolicyEngine()
         try:
-            policy = engine.parse_yaml(str(filepath))
+            policy = engine.parse_yaml_content(content)
             
             # 验证策略
             is_valid, errors = engine.validate(policy)
             
             if not is_valid:
-                error_messages = [str(e) for e in errors if e.severity == "error"]
+                # 最多返回 MAX_VALIDATION_ERRORS 条错误
+                error_iter = (str(e) for e in errors if e.severity == "error")
+                error_messages = list(itertools.islice(error_iter, MAX_VALIDATION_ERRORS))
+                truncated = next(error_iter, None) is not None
                 op_logger.log_upload(policy.id, saved_filename, False, 
                                     error="; ".join(error_messages))
                 return jsonify({
                     'success': False,
                     'error': 'Policy validation failed',
-                    'validation_errors': error_messages
+                    'validation_errors': error_messages,
+                    'validation_errors_truncated': truncated
                 }), 400
             
             # 存储策略
             policy.status = PolicyStatus.VALIDATED
-            policies_storage[policy.id] = policy
+            store_policy(policy)
+            _cache_put(_parse_cache, content_hash, copy.deepcopy(policy), PARSE_CACHE_SIZE)
             
-            # 记录日志
-            op_logger.log_upload(policy.id, saved_filename, True)
-            op_logger.log_validation(policy.id, True, 0)
-            
-            return jsonify({
-                'success': True,
-                'message': 'Policy uploaded and validated successfully',
-                'policy_id': policy.id,
-                'policy': policy.to_dict()
-            })
+            return upload_success_response(policy, saved_filename)
         
         except Exception as e:
             logger.error(f"Error parsing policy: {e}")
@@ -221,6 +397,10 @@ def upload_policy():
                 'error': f'Failed to parse policy: {str(e)}'
             }), 400
     
+    except HTTPException:
+        # 如无 Content-Length 的超大上传（413），交给对应的 errorhandler
+        raise
+    
     except Exception as e:
         logger.error(f"Error uploading policy: {e}\n{traceback.format_exc()}")
         return jsonify({
@@ -240,7 +420,6 @@ def preview_policy(policy_id):
             }), 404
         
         policy = policies_storage[policy_id]
-        engine = PolicyEngine()
         
         # 生成命令
         commands = engine.generate_commands(policy)
@@ -251,7 +430,7 @@ def preview_policy(policy_id):
             'policy_id': policy_id,
             'commands': commands,
             'preview': preview,
-            'commands_count': len([c for c in commands if c.strip()])
+            'commands_count': engine.count_commands(policy)
         })
     
     except Exception as e:
@@ -279,30 +458,16 @@ def apply_policy(policy_id):
         dry_run = data.get('dry_run', Config.DRY_RUN)
         
         # 生成命令
-        engine = PolicyEngine()
         commands = engine.generate_commands(policy)
         
-        # 连接设备
-        switch_config = Config.get_switch_config()
-        client = NXAPIClient(**switch_config)
-        
-        # 测试连接
-        if not client.test_connection():
-            error_msg = f"Failed to connect to switch {Config.SWITCH_IP}"
-            logger.error(error_msg)
-            return jsonify({
-                'success': False,
-                'error': error_msg
-            }), 500
-        
-        # 执行命令
-        result = client.execute_commands(commands, dry_run=dry_run)
+        # 执行命令（不再单独预检连接，连接失败由下发请求本身报告）
+        result = switch_client.execute_commands(commands, dry_run=dry_run)
         result.policy_id = policy_id
         
         # 更新策略状态
         if result.success and not dry_run:
             policy.status = PolicyStatus.APPLIED
-            policy.updated_at = datetime.now()
+            policy.updated_at = result.executed_at
         elif not result.success:
             policy.status = PolicyStatus.FAILED
         
@@ -316,6 +481,15 @@ def apply_policy(policy_id):
             error=result.message if not result.success else None
         )
         
+        # 连接阶段失败（命令未送达设备）
+        if result.unreachable:
+            error_msg = f"Failed to connect to switch {Config.SWITCH_IP}"
+            logger.error(f"{error_msg}: {result.message}")
+            return jsonify({
+                'success': False,
+                'error': error_msg
+            }), 500
+        
         return jsonify({
             'success': result.success,
             'message': result.message,
@@ -335,13 +509,12 @@ def apply_policy(policy_id):
 def delete_policy(policy_id):
     """删除策略"""
     try:
-        if policy_id not in policies_storage:
+        if not remove_policy(policy_id):
             return jsonify({
                 'success': False,
                 'error': 'Policy not found'
             }), 404
         
-        del policies_storage[policy_id]
         logger.info(f"Policy deleted: {policy_id}")
         
         return jsonify({
@@ -362,7 +535,7 @@ def get_logs():
     """获取日志"""
     try:
         # 获取参数
-        date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
+        date = request.args.get('date') or datetime.now().strftime('%Y-%m-%d')
         lines = int(request.args.get('lines', 100))
         
         # 读取日志文件
@@ -376,22 +549,17 @@ def get_logs():
             })
         
         # 读取最后 N 行
-        with open(log_file, 'r', encoding='utf-8') as f:
-            log_lines = f.readlines()
-        
-        # 取最后 N 行
-        recent_logs = log_lines[-lines:] if len(log_lines) > lines else log_lines
+        recent_logs = tail_lines(log_file, lines)
         
         # 解析 JSON 日志
         parsed_logs = []
         for line in recent_logs:
             try:
-                import json
-                log_entry = json.loads(line.strip())
+                log_entry = orjson.loads(line)
                 parsed_logs.append(log_entry)
-            except:
+            except ValueError:
                 # 非 JSON 格式的日志
-                parsed_logs.append({'message': line.strip()})
+                parsed_logs.append({'message': line.strip().decode('utf-8', errors='replace')})
         
         return jsonify({
             'success': True,
@@ -412,15 +580,10 @@ def get_logs():
 def test_switch_connection():
     """测试交换机连接"""
     try:
-        switch_config = Config.get_switch_config()
-        client = NXAPIClient(**switch_config)
-        
-        is_connected = client.test_connection()
+        # test_connection 本身即执行 show version，无需再发送一次
+        is_connected = switch_client.test_connection()
         
         if is_connected:
-            # 获取设备信息
-            result = client.show_command("show version")
-            
             return jsonify({
                 'success': True,
                 'connected': True,
@@ -455,6 +618,15 @@ def not_found(error):
     }), 404
 
 
+@app.errorhandler(413)
+def request_too_large(error):
+    """413 错误处理"""
+    return jsonify({
+        'success': False,
+        'error': f'File too large. Max size: {Config.MAX_UPLOAD_SIZE} bytes'
+    }), 413
+
+
 @app.errorhandler(500)
 def internal_error(error):
     """500 错误处理"""
@@ -478,10 +650,17 @@ if __name__ == '__main__':
         for error in errors:
             logger.warning(f"  - {error}")
     
-    # 启动应用
+    # 启动应用（内置服务器仅用于开发，生产环境使用 gunicorn + gevent 加载 wsgi.py）
+    is_development = Config.FLASK_ENV == 'development'
+    if not is_development:
+        logger.warning(
+            "Running the Flask development server outside development; use "
+            "'gunicorn -k gevent -w 1 --worker-connections 1000 wsgi:application' instead"
+        )
+    
     logger.info(f"Starting Flask application on {Config.FLASK_HOST}:{Config.FLASK_PORT}")
     app.run(
         host=Config.FLASK_HOST,
         port=Config.FLASK_PORT,
-        debug=Config.DEBUG
+        debug=Config.DEBUG and is_development
     )
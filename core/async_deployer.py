@@ -0,0 +1,277 @@
+"""
+异步配置下发器 - 基于 aiohttp 的 NX-API 客户端，支持多设备并发下发
+Async Deployer - aiohttp based NX-API client for concurrent multi-device deployment
+"""
+
+import asyncio
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+import aiohttp
+import orjson
+
+from .engine import engine
+from .models import ExecutionResult, PolicyModel
+from .deployer import (
+    CONNECT_TIMEOUT, DEFAULT_BATCH_SIZE, build_payload, parse_response_data, filter_commands,
+    split_batches, merge_parsed, fill_execution_result, fill_request_error
+)
+
+# 单个客户端的最大并发连接数
+CONNECTION_LIMIT = 64
+# keep-alive 连接保持时间（秒）
+KEEPALIVE_TIMEOUT = 75
+
+
+def create_session() -> aiohttp.ClientSession:
+    """
+    创建 aiohttp 会话（可由多个客户端共享同一连接池）
+    
+    认证、SSL 校验和超时按请求传入，因此同一会话可用于多台设备。
+    """
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=CONNECTION_LIMIT,
+            keepalive_timeout=KEEPALIVE_TIMEOUT
+        ),
+        headers={
+            'Content-Type': 'application/json-rpc',
+            'Accept': 'application/json'
+        }
+    )
+
+
+class AsyncNXAPIClient:
+    """异步 NX-API 客户端（接口与 NXAPIClient 一致，方法为协程）"""
+    
+    def __init__(self, host: str, username: str, password: str,
+                 port: int = 443, verify_ssl: bool = False, timeout: int = 30,
+                 session: Optional[aiohttp.ClientSession] = None):
+        """
+        初始化异步 NX-API 客户端
+        
+        Args:
+            host: 设备 IP 或主机名
+            username: 用户名
+            password: 密码
+            port: HTTPS 端口（默认 443）
+            verify_ssl: 是否验证 SSL 证书
+            timeout: 请求超时时间（秒）
+            session: 共享的 aiohttp 会话（由调用方负责关闭；为 None 时自行创建）
+        """
+        self.host = host
+        self.username = username
+        self.password = password
+        self.port = port
+        self.verify_ssl = verify_ssl
+        self.timeout = timeout
+        
+        # NX-API 端点
+        self.url = f"https://{host}:{port}/ins"
+        
+        # 按请求传入的参数（会话可能被多台设备共享）
+        self._headers = {'Authorization': aiohttp.encode_basic_auth(username, password)}
+        self._ssl = None if verify_ssl else False
+        self._timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=CONNECT_TIMEOUT)
+        
+        # 未传入会话时需在事件循环内创建，首次请求时初始化
+        self._session = session
+        self._owns_session = session is None
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取（必要时创建）aiohttp 会话"""
+        if self._owns_session and (self._session is None or self._session.closed):
+            self._session = create_session()
+        return self._session
+    
+    async def _send_request(self, payload: List[Dict]) -> Any:
+        """
+        发送 HTTP 请求并解码 JSON（使用 orjson 编解码）
+        
+        Raises:
+            aiohttp.ClientError: 请求失败
+            asyncio.TimeoutError: 请求超时
+        """
+        session = self._get_session()
+        async with session.post(self.url, data=orjson.dumps(payload), headers=self._headers,
+                                ssl=self._ssl, timeout=self._timeout) as response:
+            response.raise_for_status()
+            return orjson.loads(await response.read())
+    
+    async def test_connection(self) -> bool:
+        """测试连接"""
+        try:
+            result = await self.show_command("show version")
+            return result.get('success', False)
+        except Exception:
+            return False
+    
+    async def execute_batch(self, commands: List[Tuple[str, str]]) -> Dict[str, Any]:
+        """在一次 POST 中执行混合的 show / 配置命令（(method, cmd) 元组列表）"""
+        payload = build_payload(commands)
+        cmds = [cmd for _, cmd in commands]
+        
+        try:
+            data = await self._send_request(payload)
+            return parse_response_data(data, cmds)
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    async def show_command(self, command: str) -> Dict[str, Any]:
+        """执行 show 命令（只读）"""
+        payload = build_payload([command], method="cli")
+        
+        try:
+            data = await self._send_request(payload)
+            return parse_response_data(data, [command])
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    async def execute_commands(self, commands: List[str], dry_run: bool = False,
+                               batch_size: Optional[int] = DEFAULT_BATCH_SIZE) -> ExecutionResult:
+        """
+        执行配置命令（合并为 JSON-RPC 批量请求，每批一次 POST）
+        
+        Args:
+            commands: 命令列表
+            dry_run: 是否为预演模式（不实际执行）
+            batch_size: 每批最多命令数，超出时在配置块边界处分批（None 表示不分批）
+        
+        Returns:
+            ExecutionResult 对象
+        """
+        start_time = time.time()
+        
+        result = ExecutionResult(
+            policy_id="unknown",
+            success=True,
+            message="",
+            commands=commands,
+            dry_run=dry_run
+        )
+        
+        if dry_run:
+            result.message = "Dry-run mode: commands not executed"
+            result.duration_ms = int((time.time() - start_time) * 1000)
+            return result
+        
+        valid_commands = filter_commands(commands)
+        
+        if not valid_commands:
+            result.message = "No valid commands to execute"
+            result.duration_ms = int((time.time() - start_time) * 1000)
+            return result
+        
+        # sent 为已发出的命令数（用于区分失败与未发送的命令）
+        parsed = {'success': True, 'results': [], 'sent': 0}
+        
+        try:
+            for start_id, batch in split_batches(commands, batch_size):
+                payload = build_payload(batch, method="cli_conf", start_id=start_id)
+                parsed['sent'] += len(batch)
+                data = await self._send_request(payload)
+                merge_parsed(parsed, parse_response_data(data, batch, start_id))
+                if not parsed['success']:
+                    break
+            
+            fill_execution_result(result, parsed, valid_commands)
+        
+        except aiohttp.ConnectionTimeoutError:
+            fill_request_error(result, parsed, valid_commands,
+                               f"Connection timeout after {CONNECT_TIMEOUT} seconds", unreachable=True)
+        
+        except asyncio.TimeoutError:
+            # 读超时：请求已送达，设备可能已部分执行
+            fill_request_error(result, parsed, valid_commands,
+                               f"Request timeout after {self.timeout} seconds")
+        
+        except aiohttp.ClientConnectionError as e:
+            fill_request_error(result, parsed, valid_commands, f"Connection error: {str(e)}",
+                               unreachable=isinstance(e, aiohttp.ClientConnectorError))
+        
+        except Exception as e:
+            fill_request_error(result, parsed, valid_commands, f"Unexpected error: {str(e)}")
+        
+        finally:
+            result.duration_ms = int((time.time() - start_time) * 1000)
+        
+        return result
+    
+    async def close(self):
+        """关闭会话（共享会话由创建方关闭）"""
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+    
+    async def __aenter__(self):
+        """异步上下文管理器入口"""
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """异步上下文管理器退出"""
+        await self.close()
+
+
+async def deploy_many(clients: List[AsyncNXAPIClient], commands: List[str],
+                      dry_run: bool = False) -> List[ExecutionResult]:
+    """
+    并发下发同一组命令到多台设备
+    
+    Args:
+        clients: 异步客户端列表
+        commands: 命令列表
+        dry_run: 是否为预演模式
+    
+    Returns:
+        与 clients 顺序一致的 ExecutionResult 列表
+    """
+    return list(await asyncio.gather(
+        *(client.execute_commands(commands, dry_run=dry_run) for client in clients)
+    ))
+
+
+async def load_policies(paths: List[str]) -> List[PolicyModel]:
+    """
+    并发读取并解析多个策略文件（文件读取在线程池中进行，不阻塞事件循环）
+    
+    Args:
+        paths: YAML 策略文件路径列表
+    
+    Returns:
+        与 paths 顺序一致的 PolicyModel 列表
+    
+    Raises:
+        FileNotFoundError: 文件不存在
+        ValueError: 策略内容不合法
+    """
+    return list(await asyncio.gather(
+        *(asyncio.to_thread(engine.parse_yaml, path) for path in paths)
+    ))
+
+
+def deploy_many_sync(switch_configs: List[Dict[str, Any]], commands: List[str],
+                     dry_run: bool = False) -> List[ExecutionResult]:
+    """
+    deploy_many 的同步封装（供现有同步调用方使用）
+    
+    Args:
+        switch_configs: 设备配置列表（同 Config.get_switch_config() 格式）
+        commands: 命令列表
+        dry_run: 是否为预演模式
+    
+    Returns:
+        与 switch_configs 顺序一致的 ExecutionResult 列表
+    """
+    async def _run():
+        # 所有设备共用一个会话和连接池
+        async with create_session() as session:
+            clients = [AsyncNXAPIClient(**cfg, session=session) for cfg in switch_configs]
+            return await deploy_many(clients, commands, dry_run=dry_run)
+    
+    return asyncio.run(_run())
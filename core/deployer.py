@@ -4,20 +4,421 @@ Deployer - Communicate with Cisco Nexus devices via NX-API
 """
 
 import requests
-import json
-from typing import List, Dict, Any, Optional
-from urllib3.exceptions import InsecureRequestWarning
+from requests.adapters import HTTPAdapter
+import orjson
+import ssl
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
+from urllib3.exceptions import InsecureRequestWarning, MaxRetryError, NewConnectionError
+from urllib3.util.retry import Retry
+import threading
 import time
+import atexit
 
 from .models import ExecutionResult, CommandResult
 
 # 禁用 SSL 警告（仅用于开发环境）
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
+# 不校验证书时共用的 SSLContext（进程内只构建一次）
+_UNVERIFIED_SSL_CONTEXT = ssl.create_default_context()
+_UNVERIFIED_SSL_CONTEXT.check_hostname = False
+_UNVERIFIED_SSL_CONTEXT.verify_mode = ssl.CERT_NONE
+
+# 连接池大小（复用 TCP/TLS 连接，避免每次请求重新握手）
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 32
+
+# 失败重试：仅 502/503（请求未被设备后端处理）按指数退避重试；
+# 504 时后端可能仍在执行 cli_conf，重试会重复下发，因此不重试。
+# 连接失败与读超时均不重试：read=False 原样抛出读超时（requests 转为 ReadTimeout，
+# 若为 0 会被包装成 MaxRetryError 再转为 ConnectionError）；connect=0 时 requests
+# 仍按原因转为 ConnectTimeout / ConnectionError（False 会让连接被拒漏出 urllib3 异常）
+MAX_RETRIES = Retry(
+    total=3,
+    connect=0,
+    read=False,
+    backoff_factor=0.3,
+    status_forcelist=(502, 503),
+    allowed_methods=frozenset({'POST'}),
+    raise_on_status=False
+)
+
+# 建立连接的超时时间（秒），设备不可达时尽快失败，读超时仍使用 timeout 参数
+CONNECT_TIMEOUT = 3
+
+# NX-OS 正则中需要转义才能按字面匹配的字符
+_NXOS_REGEX_SPECIAL = frozenset('\\.^$*+?()[]{}|')
+
+# 单次 POST 的默认最大命令数（超出时在配置块边界处分批）
+DEFAULT_BATCH_SIZE = 64
+
+
+def filter_commands(commands: List[str]) -> List[str]:
+    """过滤空命令和注释"""
+    return [cmd.strip() for cmd in commands if cmd.strip() and not cmd.strip().startswith('#')]
+
+
+def split_batches(commands: List[str], batch_size: Optional[int]) -> Iterator[Tuple[int, List[str]]]:
+    """
+    按批次切分命令（过滤空命令和注释）
+    
+    只在顶层命令（无缩进）处切分，保证子命令与其所属的配置块
+    （ip access-list / class-map / policy-map / interface）在同一批次中下发。
+    
+    Args:
+        commands: 原始命令列表
+        batch_size: 每批最多命令数（None 或 0 表示不切分）
+    
+    Yields:
+        (该批第一条命令的 JSON-RPC id, 命令列表)
+    """
+    batch: List[str] = []
+    next_id = 1
+    
+    for cmd in commands:
+        stripped = cmd.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+        
+        if batch_size and len(batch) >= batch_size and not cmd[:1].isspace():
+            yield next_id, batch
+            next_id += len(batch)
+            batch = []
+        
+        batch.append(stripped)
+    
+    if batch:
+        yield next_id, batch
+
+
+def build_payload(commands: List[Union[str, Tuple[str, str]]], method: str = "cli_conf",
+                  start_id: int = 1) -> List[Dict]:
+    """
+    构建 JSON-RPC 请求体
+    
+    Args:
+        commands: 命令列表，元素可以是命令字符串，或 (method, cmd) 元组（混合 show/conf 批量请求）
+        method: 默认方法名（cli/cli_conf/cli_show_ascii）
+        start_id: 第一条命令的 JSON-RPC id（之后依次递增）
+    
+    Returns:
+        JSON-RPC 请求列表
+    """
+    payload = []
+    
+    for i, cmd in enumerate(commands, start=start_id):
+        if isinstance(cmd, tuple):
+            cmd_method, cmd = cmd
+        else:
+            cmd_method = method
+        
+        payload.append({
+            "jsonrpc": "2.0",
+            "method": cmd_method,
+            "params": {
+                "cmd": cmd,
+                "version": 1
+            },
+            "id": i
+        })
+    
+    return payload
+
+
+def parse_response_data(data: Any, commands: List[str], start_id: int = 1) -> Dict[str, Any]:
+    """
+    解析 NX-API 响应数据（已解码的 JSON）
+    
+    Args:
+        data: 响应 JSON
+        commands: 原始命令列表
+        start_id: 第一条命令的 JSON-RPC id
+    
+    Returns:
+        解析后的结果字典
+    """
+    # data 是一个列表，每个元素对应一条命令的响应
+    if not isinstance(data, list):
+        data = [data]
+    
+    # 按 JSON-RPC id 对应到命令，部分失败时也能准确定位
+    if all(isinstance(item, dict) and 'id' in item for item in data):
+        by_id = {item['id']: item for item in data}
+        data = [by_id.get(start_id + i, item) for i, item in enumerate(data)]
+    
+    result = {
+        'success': True,
+        'results': []
+    }
+    
+    for i, item in enumerate(data):
+        # 检查错误
+        if 'error' in item:
+            error_info = item['error']
+            error_msg = error_info.get('message', 'Unknown error')
+            error_data = error_info.get('data', {})
+            
+            result['success'] = False
+            result['error'] = f"Command #{start_id + i} failed: {error_msg}"
+            
+            if 'msg' in error_data:
+                result['error'] += f" - {error_data['msg']}"
+            
+            result['failed_command'] = commands[i] if i < len(commands) else 'unknown'
+            break
+        
+        # 成功的响应
+        if 'result' in item:
+            result['results'].append(item['result'])
+    
+    return result
+
+
+def merge_parsed(total: Dict[str, Any], parsed: Dict[str, Any]):
+    """将一个批次的解析结果合并到总结果中"""
+    total['results'].extend(parsed.get('results', []))
+    
+    if not parsed['success']:
+        total['success'] = False
+        total['error'] = parsed.get('error', 'Unknown error')
+        total['failed_command'] = parsed.get('failed_command', 'unknown')
+
+
+def fill_execution_result(result: ExecutionResult, parsed: Dict[str, Any],
+                          valid_commands: List[str]):
+    """
+    根据解析结果填充 ExecutionResult
+    
+    分批下发时，失败之前已成功的命令在设备上已经生效，仍记为成功；
+    失败批次中的其余命令记为失败，之后未下发的批次记为未发送。
+    
+    Args:
+        result: 执行结果对象
+        parsed: 合并后的解析结果（results 为已成功命令的结果，sent 为已发出的命令数）
+        valid_commands: 实际下发的命令列表
+    """
+    # 记录每条命令的结果（cli_conf 成功时 result 为 null，输出为空）
+    outputs = [_result_output(item) for item in parsed.get('results', [])]
+    
+    if parsed['success']:
+        result.message = f"Successfully executed {len(valid_commands)} commands"
+        
+        outputs += [''] * (len(valid_commands) - len(outputs))
+        result.command_results = [
+            CommandResult(command=cmd, success=True, output=output)
+            for cmd, output in zip(valid_commands, outputs)
+        ]
+        return
+    
+    error = parsed.get('error', 'Unknown error')
+    applied = min(len(outputs), len(valid_commands))
+    sent = max(applied, min(parsed.get('sent', len(valid_commands)), len(valid_commands)))
+    
+    result.success = False
+    result.message = error
+    if applied:
+        result.message += (
+            f" (partially applied: {applied} of {len(valid_commands)} commands "
+            f"were configured before the failure)"
+        )
+    result.add_error(result.message)
+    
+    result.command_results = [
+        CommandResult(command=cmd, success=True, output=output)
+        for cmd, output in zip(valid_commands[:applied], outputs)
+    ]
+    result.command_results += [
+        CommandResult(command=cmd, success=False, error=error)
+        for cmd in valid_commands[applied:sent]
+    ]
+    result.command_results += [
+        CommandResult(command=cmd, success=False, sent=False,
+                      error="Not sent: an earlier batch failed")
+        for cmd in valid_commands[sent:]
+    ]
+
+
+def is_connect_failure(error: requests.exceptions.ConnectionError) -> bool:
+    """是否为建立连接阶段的失败（连接被拒、域名解析失败等，请求未送达设备）"""
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, NewConnectionError)
+
+
+def fill_request_error(result: ExecutionResult, parsed: Dict[str, Any],
+                       valid_commands: List[str], error: str, unreachable: bool = False):
+    """
+    请求异常（超时 / 连接失败等）时填充 ExecutionResult
+    
+    Args:
+        result: 执行结果对象
+        parsed: 异常发生前合并的解析结果
+        valid_commands: 实际下发的命令列表
+        error: 错误信息
+        unreachable: 是否为连接阶段失败（请求未送达设备）
+    """
+    parsed['success'] = False
+    parsed['error'] = error
+    fill_execution_result(result, parsed, valid_commands)
+    # 之前的批次已生效时按部分下发失败报告，而不是设备不可达
+    result.unreachable = unreachable and not parsed['results']
+
+
+def _parse_command_tree(commands: List[str]) -> List[Tuple[str, list]]:
+    """按缩进将命令解析为 (命令, 子节点列表) 树（跳过空命令和注释）"""
+    roots: List[Tuple[str, list]] = []
+    stack: List[Tuple[int, list]] = [(-1, roots)]
+    for cmd in commands:
+        stripped = cmd.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+        indent = len(cmd) - len(cmd.lstrip())
+        while stack[-1][0] >= indent:
+            stack.pop()
+        node = (cmd, [])
+        stack[-1][1].append(node)
+        stack.append((indent, node[1]))
+    return roots
+
+
+def _tree_key(nodes: List[Tuple[str, list]]) -> tuple:
+    """配置块内容的可比较表示（忽略缩进差异）"""
+    return tuple((cmd.strip(), _tree_key(children)) for cmd, children in nodes)
+
+
+def dedupe_command_groups(groups: List[List[str]]) -> List[List[str]]:
+    """
+    去除多组命令之间的重复配置（多个策略共用同名 ACL/class-map/policy-map 时）
+    
+    按缩进将每组命令解析为配置块树，以所在模式路径判重：
+    - 配置块内容与该路径上次下发的内容完全相同时整块丢弃；
+      不同则逐个处理子命令，子命令全部被丢弃时模式命令也不再下发
+    - 叶子命令仅在与同一模式下上一条下发的叶子命令相同时丢弃，
+      避免 [A, B, A] 这类覆盖顺序被打乱（如 set dscp 46 / 10 / 46）
+    - no / default 命令清空该模式下的判重记录，保证删除后重新下发的配置不被误删
+    
+    空命令和注释不会下发，去重后不再保留。
+    
+    Args:
+        groups: 命令组列表（组内保持原有顺序）
+    
+    Returns:
+        与 groups 一一对应的去重后命令组
+    """
+    # 路径 -> 上次下发的配置块内容；路径 -> 该模式下上一条下发的叶子命令
+    blocks: Dict[Tuple[str, ...], tuple] = {}
+    last_leaf: Dict[Tuple[str, ...], str] = {}
+    
+    def forget(parent: Tuple[str, ...]) -> None:
+        depth = len(parent)
+        for records in (blocks, last_leaf):
+            for path in [path for path in records if path[:depth] == parent]:
+                del records[path]
+    
+    def emit(nodes: List[Tuple[str, list]], parent: Tuple[str, ...], out: List[str]) -> None:
+        for cmd, children in nodes:
+            stripped = cmd.strip()
+            if children:
+                path = parent + (stripped,)
+                content = _tree_key(children)
+                if blocks.get(path) == content:
+                    continue
+                body: List[str] = []
+                emit(children, path, body)
+                blocks[path] = content
+                if body:
+                    last_leaf.pop(parent, None)
+                    out.append(cmd)
+                    out.extend(body)
+            elif stripped.startswith(('no ', 'default ')):
+                forget(parent)
+                out.append(cmd)
+            elif last_leaf.get(parent) != stripped:
+                last_leaf[parent] = stripped
+                out.append(cmd)
+    
+    deduped: List[List[str]] = []
+    for group in groups:
+        out: List[str] = []
+        emit(_parse_command_tree(group), (), out)
+        deduped.append(out)
+    return deduped
+
+
+def group_command_results(command_results: List[CommandResult],
+                          groups: List[List[str]]) -> List[List[CommandResult]]:
+    """
+    将合并执行的命令结果按原命令组切分
+    
+    Args:
+        command_results: 合并执行得到的逐条命令结果
+        groups: 合并前的命令组（如每个策略一组）
+    
+    Returns:
+        与 groups 一一对应的命令结果列表
+    """
+    grouped = []
+    start = 0
+    for group in groups:
+        end = start + len(filter_commands(group))
+        grouped.append(command_results[start:end])
+        start = end
+    return grouped
+
+
+def nxos_include_pattern(pattern: str) -> str:
+    """
+    将配置片段转换为 NX-OS "| include" 的参数（按字面匹配）
+    
+    NX-OS 的 include 参数是以空格分隔的正则表达式：整体加双引号保留空格，
+    只转义正则元字符（Python 的 re.escape 会转义空格和 '-' 等字符，
+    NX-OS 不识别这些转义）。片段中的双引号无法在引号内表示，用 '.' 匹配。
+    前导缩进在设备输出中不可靠，去掉后匹配。
+    """
+    escaped = ''.join(
+        '\\' + ch if ch in _NXOS_REGEX_SPECIAL else ch
+        for ch in pattern.strip()
+    ).replace('"', '.')
+    return f'"{escaped}"'
+
+
+def iter_lines(text: str) -> Iterator[str]:
+    """按行惰性迭代文本，调用方找到目标后即可停止"""
+    start = 0
+    while start < len(text):
+        end = text.find('\n', start)
+        if end == -1:
+            end = len(text)
+        yield text[start:end].rstrip('\r')
+        start = end + 1
+
+
+def _result_output(item: Any) -> Any:
+    """提取单条命令结果中的输出"""
+    if not isinstance(item, dict):
+        return ''
+    body = item.get('body')
+    if isinstance(body, dict):
+        return body.get('TABLE_result', '')
+    return body or ''
+
+
+class _UnverifiedHTTPAdapter(HTTPAdapter):
+    """使用预构建 SSLContext 的适配器（verify_ssl=False 时使用）"""
+    
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = _UNVERIFIED_SSL_CONTEXT
+        return super().init_poolmanager(*args, **kwargs)
+
 
 class NXAPIClient:
     """NX-API 客户端"""
     
+    # 按设备共享的会话（连接池），同一设备的所有客户端实例复用 TCP/TLS 连接
+    _session_cache: Dict[Tuple[str, int, str, bool], requests.Session] = {}
+    _session_lock = threading.Lock()
+    
     def __init__(self, host: str, username: str, password: str, 
                  port: int = 443, verify_ssl: bool = False, timeout: int = 30):
         """
@@ -41,13 +442,41 @@ class NXAPIClient:
         # NX-API 端点
         self.url = f"https://{host}:{port}/ins"
         
-        # 会话
-        self.session = requests.Session()
-        self.session.auth = (username, password)
-        self.session.headers.update({
-            'Content-Type': 'application/json-rpc',
-            'Accept': 'application/json'
-        })
+        # 认证信息随请求发送，会话按设备共享
+        self.auth = (username, password)
+        self.session = self._get_session(host, port, username, verify_ssl)
+    
+    @classmethod
+    def _get_session(cls, host: str, port: int, username: str, verify_ssl: bool) -> requests.Session:
+        """获取（必要时创建）设备对应的共享会话"""
+        key = (host, port, username, verify_ssl)
+        
+        with cls._session_lock:
+            session = cls._session_cache.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter_cls = HTTPAdapter if verify_ssl else _UnverifiedHTTPAdapter
+                adapter = adapter_cls(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                                      max_retries=MAX_RETRIES)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.verify = verify_ssl
+                session.headers.update({
+                    'Content-Type': 'application/json-rpc',
+                    'Accept': 'application/json',
+                    'Connection': 'keep-alive'
+                })
+                cls._session_cache[key] = session
+        
+        return session
+    
+    @classmethod
+    def close_all(cls):
+        """关闭所有共享会话（进程退出时调用）"""
+        with cls._session_lock:
+            for session in cls._session_cache.values():
+                session.close()
+            cls._session_cache.clear()
     
     def test_connection(self) -> bool:
         """
@@ -68,7 +497,7 @@ class NXAPIClient:
         
         Args:
             command: show 命令
-            
+        
         Returns:
             执行结果字典
         """
@@ -83,15 +512,16 @@ class NXAPIClient:
                 'error': str(e)
             }
     
-    def execute_commands(self, commands: List[str], 
-                        dry_run: bool = False) -> ExecutionResult:
+    def execute_commands(self, commands: List[str], dry_run: bool = False,
+                         batch_size: Optional[int] = DEFAULT_BATCH_SIZE) -> ExecutionResult:
         """
-        执行配置命令（批量）
+        执行配置命令（合并为 JSON-RPC 批量请求，每批一次 POST）
         
         Args:
             commands: 命令列表
             dry_run: 是否为预演模式（不实际执行）
-            
+            batch_size: 每批最多命令数，超出时在配置块边界处分批（None 表示不分批）
+        
         Returns:
             ExecutionResult 对象
         """
@@ -111,177 +541,153 @@ class NXAPIClient:
             return result
         
         # 过滤空命令和注释
-        valid_commands = [cmd.strip() for cmd in commands if cmd.strip() and not cmd.strip().startswith('#')]
+        valid_commands = filter_commands(commands)
         
         if not valid_commands:
             result.message = "No valid commands to execute"
             result.duration_ms = int((time.time() - start_time) * 1000)
             return result
         
+        # sent 为已发出的命令数（用于区分失败与未发送的命令）
+        parsed = {'success': True, 'results': [], 'sent': 0}
+        
         try:
-            # 构建 JSON-RPC 请求
-            payload = self._build_payload(valid_commands, method="cli_conf")
-            
-            # 发送请求
-            response = self._send_request(payload)
-            
-            # 解析响应
-            parsed = self._parse_response(response, valid_commands)
-            
-            if parsed['success']:
-                result.message = f"Successfully executed {len(valid_commands)} commands"
+            for start_id, batch in split_batches(commands, batch_size):
+                # 构建 JSON-RPC 请求
+                payload = self._build_payload(batch, method="cli_conf", start_id=start_id)
                 
-                # 记录每条命令的结果
-                for i, cmd in enumerate(valid_commands):
-                    cmd_result = CommandResult(
-                        command=cmd,
-                        success=True,
-                        output=parsed.get('results', [{}])[i].get('body', {}).get('TABLE_result', '')
-                    )
-                    result.command_results.append(cmd_result)
-            else:
-                result.success = False
-                result.message = parsed.get('error', 'Unknown error')
-                result.add_error(parsed.get('error', 'Unknown error'))
+                # 发送请求
+                parsed['sent'] += len(batch)
+                response = self._send_request(payload)
                 
-                # 记录失败的命令
-                for cmd in valid_commands:
-                    cmd_result = CommandResult(
-                        command=cmd,
-                        success=False,
-                        error=parsed.get('error', 'Unknown error')
-                    )
-                    result.command_results.append(cmd_result)
+                # 解析响应，失败后不再下发后续批次
+                merge_parsed(parsed, self._parse_response(response, batch, start_id))
+                if not parsed['success']:
+                    break
+            
+            fill_execution_result(result, parsed, valid_commands)
+        
+        except requests.exceptions.ConnectTimeout:
+            fill_request_error(result, parsed, valid_commands,
+                               f"Connection timeout after {CONNECT_TIMEOUT} seconds", unreachable=True)
         
         except requests.exceptions.Timeout:
-            result.success = False
-            result.message = f"Request timeout after {self.timeout} seconds"
-            result.add_error(result.message)
+            # 读超时：请求已送达，设备可能已部分执行
+            fill_request_error(result, parsed, valid_commands,
+                               f"Request timeout after {self.timeout} seconds")
         
         except requests.exceptions.ConnectionError as e:
-            result.success = False
-            result.message = f"Connection error: {str(e)}"
-            result.add_error(result.message)
+            fill_request_error(result, parsed, valid_commands, f"Connection error: {str(e)}",
+                               unreachable=is_connect_failure(e))
         
         except Exception as e:
-            result.success = False
-            result.message = f"Unexpected error: {str(e)}"
-            result.add_error(result.message)
+            fill_request_error(result, parsed, valid_commands, f"Unexpected error: {str(e)}")
         
         finally:
             result.duration_ms = int((time.time() - start_time) * 1000)
         
         return result
     
-    def _build_payload(self, commands: List[str], method: str = "cli_conf") -> List[Dict]:
+    def execute_command_groups(self, groups: List[List[str]], dry_run: bool = False,
+                               batch_size: Optional[int] = DEFAULT_BATCH_SIZE,
+                               dedupe: bool = True
+                               ) -> Tuple[ExecutionResult, List[List[CommandResult]]]:
         """
-        构建 JSON-RPC 请求体
+        合并多组命令（如多个策略）一起下发，减少 HTTP 往返次数
+        
+        合并后仍按 batch_size 在配置块边界处分批，单次 POST 不会无限增大。
         
         Args:
-            commands: 命令列表
-            method: 方法名（cli_show/cli_conf/cli_show_ascii）
-            
+            groups: 命令组列表
+            dry_run: 是否为预演模式（不实际执行）
+            batch_size: 每批最多命令数（None 表示全部放入一次 POST）
+            dedupe: 是否去除组间重复的配置命令
+        
         Returns:
-            JSON-RPC 请求列表
+            (合并的 ExecutionResult, 按组切分的命令结果列表，对应去重后的命令)
         """
-        payload = []
+        if dedupe:
+            groups = dedupe_command_groups(groups)
+        commands = [cmd for group in groups for cmd in group]
+        result = self.execute_commands(commands, dry_run=dry_run, batch_size=batch_size)
+        return result, group_command_results(result.command_results, groups)
+    
+    def execute_batch(self, commands: List[Tuple[str, str]]) -> Dict[str, Any]:
+        """
+        在一次 POST 中执行混合的 show / 配置命令
         
-        for i, cmd in enumerate(commands, start=1):
-            payload.append({
-                "jsonrpc": "2.0",
-                "method": method,
-                "params": {
-                    "cmd": cmd,
-                    "version": 1
-                },
-                "id": i
-            })
+        Args:
+            commands: (method, cmd) 元组列表，如 [("cli", "show version"), ("cli_conf", "...")]
         
-        return payload
+        Returns:
+            解析后的结果字典（results 与 commands 一一对应）
+        """
+        payload = self._build_payload(commands)
+        cmds = [cmd for _, cmd in commands]
+        
+        try:
+            response = self._send_request(payload)
+            return self._parse_response(response, cmds)
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def _build_payload(self, commands: List[Union[str, Tuple[str, str]]], method: str = "cli_conf",
+                       start_id: int = 1) -> List[Dict]:
+        """构建 JSON-RPC 请求体"""
+        return build_payload(commands, method, start_id)
     
     def _send_request(self, payload: List[Dict]) -> requests.Response:
         """
-        发送 HTTP 请求
+        发送 HTTP 请求（请求体由 orjson 直接序列化为 bytes）
         
         Args:
             payload: JSON-RPC 请求体
-            
+        
         Returns:
             Response 对象
-            
+        
         Raises:
             requests.exceptions.RequestException: 请求失败
         """
         response = self.session.post(
             self.url,
-            json=payload,
+            data=orjson.dumps(payload),
+            auth=self.auth,
+            # 显式传入：否则 REQUESTS_CA_BUNDLE 等环境变量会覆盖 session.verify
             verify=self.verify_ssl,
-            timeout=self.timeout
+            timeout=(CONNECT_TIMEOUT, self.timeout)
         )
         
         response.raise_for_status()
         return response
     
     def _parse_response(self, response: requests.Response, 
-                       commands: List[str]) -> Dict[str, Any]:
-        """
-        解析 NX-API 响应
-        
-        Args:
-            response: HTTP 响应对象
-            commands: 原始命令列表
-            
-        Returns:
-            解析后的结果字典
-        """
+                       commands: List[str], start_id: int = 1) -> Dict[str, Any]:
+        """解析 NX-API 响应"""
         try:
-            data = response.json()
-        except json.JSONDecodeError as e:
+            data = orjson.loads(response.content)
+        except orjson.JSONDecodeError as e:
             return {
                 'success': False,
                 'error': f"Failed to parse JSON response: {e}"
             }
         
-        # data 是一个列表，每个元素对应一条命令的响应
-        if not isinstance(data, list):
-            data = [data]
-        
-        result = {
-            'success': True,
-            'results': []
-        }
-        
-        for i, item in enumerate(data):
-            # 检查错误
-            if 'error' in item:
-                error_info = item['error']
-                error_msg = error_info.get('message', 'Unknown error')
-                error_data = error_info.get('data', {})
-                
-                result['success'] = False
-                result['error'] = f"Command #{i+1} failed: {error_msg}"
-                
-                if 'msg' in error_data:
-                    result['error'] += f" - {error_data['msg']}"
-                
-                result['failed_command'] = commands[i] if i < len(commands) else 'unknown'
-                break
-            
-            # 成功的响应
-            if 'result' in item:
-                result['results'].append(item['result'])
-        
-        return result
+        return parse_response_data(data, commands, start_id)
     
-    def get_running_config(self, section: Optional[str] = None) -> str:
+    def get_running_config(self, section: Optional[str] = None, *,
+                           as_iter: bool = False) -> Union[str, Iterator[str]]:
         """
         获取运行配置
         
         Args:
             section: 配置段（如 'interface'、'ip access-list'）
-            
+            as_iter: 为 True 时返回逐行迭代器（不再拆分出整份行列表）
+        
         Returns:
-            配置文本
+            配置文本，或配置行迭代器
         """
         if section:
             cmd = f"show running-config {section}"
@@ -290,35 +696,58 @@ class NXAPIClient:
         
         result = self.show_command(cmd)
         
+        config = ""
         if result.get('success'):
             # 从结果中提取配置文本
             results = result.get('results', [])
             if results and 'body' in results[0]:
-                return results[0]['body']
+                config = results[0]['body']
         
-        return ""
+        if as_iter:
+            return iter_lines(config)
+        return config
     
-    def verify_configuration(self, expected_patterns: List[str]) -> Dict[str, bool]:
+    def verify_configuration(self, expected_patterns: List[str]) -> Dict[str, Optional[bool]]:
         """
-        验证配置是否生效
+        验证配置是否生效（每个片段一条 show running-config | include，合并为一次批量请求）
         
         Args:
             expected_patterns: 期望出现的配置片段列表
-            
+        
         Returns:
-            验证结果字典 {pattern: exists}
+            验证结果字典 {pattern: exists}；设备对该条查询返回错误时为 None（无法判断）
+        
+        Raises:
+            requests.exceptions.RequestException: 请求失败（不会被当作配置不存在）
+            orjson.JSONDecodeError: 响应不是合法 JSON
         """
-        config = self.get_running_config()
+        if not expected_patterns:
+            return {}
+        
+        commands = [
+            f"show running-config | include {nxos_include_pattern(pattern)}"
+            for pattern in expected_patterns
+        ]
+        payload = self._build_payload(commands, method="cli")
+        data = orjson.loads(self._send_request(payload).content)
         
-        verification = {}
-        for pattern in expected_patterns:
-            verification[pattern] = pattern in config
+        # 按 JSON-RPC id 逐条取结果，单条失败不影响其他片段
+        if not isinstance(data, list):
+            data = [data]
+        by_id = {item.get('id'): item for item in data if isinstance(item, dict)}
+        
+        verification: Dict[str, Optional[bool]] = {}
+        for i, pattern in enumerate(expected_patterns, start=1):
+            item = by_id.get(i)
+            if item is None or 'error' in item:
+                verification[pattern] = None
+            else:
+                verification[pattern] = bool(_result_output(item.get('result')))
         
         return verification
     
     def close(self):
-        """关闭会话"""
-        self.session.close()
+        """关闭客户端（会话由同一设备的客户端共享，进程退出时由 close_all 统一关闭）"""
     
     def __enter__(self):
         """上下文管理器入口"""
@@ -327,3 +756,6 @@ class NXAPIClient:
     def __exit__(self, exc_type, exc_val, exc_tb):
         """上下文管理器退出"""
         self.close()
+
+
+atexit.register(NXAPIClient.close_all)
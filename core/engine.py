@@ -4,22 +4,97 @@ Policy Engine - Parse YAML policies and generate NX-CLI commands
 """
 
 import yaml
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Callable, Set, Tuple
 from pathlib import Path
+from collections import Counter, OrderedDict
+from functools import partial
+import hashlib
+import os
+import pickle
 import re
+import string
+import tempfile
+import threading
+from datetime import datetime
 
 from .models import (
     PolicyModel, AccessList, ACLRule, ACLType, ClassMap, 
     PolicyMap, PolicyMapClass, ServicePolicy, PolicyStatus, ValidationError
 )
 
+# 接口名称格式（模块加载时编译一次）
+_INTERFACE_RE = re.compile(r'^(?:Ethernet|Vlan|port-channel)\d+(?:/\d+)?$', re.IGNORECASE)
+
+# class-map 匹配条件与 policy-map 动作的命令模板（类型 -> 模板 / (模板, 默认值)）
+_CONDITION_TEMPLATES = {
+    'access-group': "  match access-group name {name}",
+    'dscp': "  match dscp {value}",
+    'precedence': "  match precedence {value}",
+}
+_ACTION_TEMPLATES = {
+    'set': ("    set {parameter} {value}", {}),
+    'police': ("    police cir {rate}", {'rate': '10m'}),
+    'bandwidth': ("    bandwidth {value}", {'value': '10'}),
+}
+
+
+def _template_fields(template: str) -> Tuple[str, ...]:
+    """提取模板中的占位字段名"""
+    return tuple(name for _, name, _, _ in string.Formatter().parse(template) if name)
+
+
+# 各条目解析时必须提供的字段（条件/动作按模板推导，有默认值的字段除外）
+_ACL_RULE_FIELDS = ('sequence', 'action', 'protocol', 'source', 'destination')
+_SERVICE_POLICY_FIELDS = ('interface', 'direction', 'policy_map')
+_CONDITION_FIELDS = {
+    cond_type: _template_fields(template)
+    for cond_type, template in _CONDITION_TEMPLATES.items()
+}
+_ACTION_FIELDS = {
+    action_type: tuple(f for f in _template_fields(template) if f not in defaults)
+    for action_type, (template, defaults) in _ACTION_TEMPLATES.items()
+}
+
+
+# 生成命令缓存的默认容量
+COMMANDS_CACHE_SIZE = 512
+
+# 解析结果磁盘缓存目录；PolicyModel 结构变化时递增版本号使旧缓存失效
+POLICY_CACHE_DIR = Path.home() / '.cache' / 'sdn' / 'policies'
+POLICY_CACHE_VERSION = 1
+
+# 优先使用 libyaml 的 C 实现加速解析，不可用时回退到纯 Python 实现
+try:
+    from yaml import CSafeLoader as _YAMLLoader
+except ImportError:
+    from yaml import SafeLoader as _YAMLLoader
+
+
+def _require_fields(item: Any, fields: Tuple[str, ...], where: str):
+    """
+    检查条目为字典且包含必需字段
+    
+    Raises:
+        ValueError: 条目类型不对或缺少字段
+    """
+    if not isinstance(item, dict):
+        raise ValueError(f"Invalid entry at {where}: expected a mapping")
+    for name in fields:
+        if name not in item:
+            raise ValueError(f"Missing required field: {where}.{name}")
+
 
 class PolicyEngine:
     """策略引擎核心类"""
     
-    def __init__(self):
+    def __init__(self, commands_cache_size: int = COMMANDS_CACHE_SIZE):
         """初始化策略引擎"""
         self.validation_errors: List[ValidationError] = []
+        
+        # 渲染结果缓存：策略指纹 -> (命令元组, 命令文本, 非空命令数)（LRU）
+        self._commands_cache: "OrderedDict[str, Tuple[Tuple[str, ...], str, int]]" = OrderedDict()
+        self._commands_cache_size = commands_cache_size
+        self._cache_lock = threading.Lock()
     
     def parse_yaml(self, filepath: str) -> PolicyModel:
         """
@@ -41,11 +116,79 @@ class PolicyEngine:
         if not file_path.exists():
             raise FileNotFoundError(f"Policy file not found: {filepath}")
         
-        with open(file_path, 'r', encoding='utf-8') as f:
+        # 以二进制读取，由 libyaml 直接解码 UTF-8
+        with open(file_path, 'rb') as f:
+            return self.parse_yaml_content(f)
+    
+    def parse_yaml_cached(self, filepath: str, cache_dir: Path = POLICY_CACHE_DIR) -> PolicyModel:
+        """
+        解析 YAML 策略文件，按文件内容哈希复用磁盘上的 pickle 缓存
+        
+        Args:
+            filepath: YAML 文件路径
+            cache_dir: 缓存目录
+            
+        Returns:
+            PolicyModel 对象
+            
+        Raises:
+            FileNotFoundError: 文件不存在
+            ValueError: 策略内容不合法
+        """
+        file_path = Path(filepath)
+        if not file_path.exists():
+            raise FileNotFoundError(f"Policy file not found: {filepath}")
+        
+        content = file_path.read_bytes()
+        digest = hashlib.sha256(content).hexdigest()
+        cache_file = Path(cache_dir) / f"v{POLICY_CACHE_VERSION}-{digest}.pkl"
+        
+        # 命中缓存：直接反序列化，跳过 YAML 解析
+        try:
+            with open(cache_file, 'rb') as f:
+                policy = pickle.load(f)
+            if isinstance(policy, PolicyModel):
+                policy.created_at = policy.updated_at = datetime.now()
+                return policy
+        except Exception:
+            # 缓存不存在、损坏或与当前模型不兼容时重新解析
+            pass
+        
+        policy = self.parse_yaml_content(content)
+        
+        # 写入缓存（先写临时文件再替换，缓存写失败不影响解析结果）
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_file.parent, suffix='.tmp')
             try:
-                data = yaml.safe_load(f)
-            except yaml.YAMLError as e:
-                raise ValueError(f"Invalid YAML format: {e}")
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(policy, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, cache_file)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError:
+            pass
+        
+        return policy
+    
+    def parse_yaml_content(self, content) -> PolicyModel:
+        """
+        解析 YAML 策略内容
+        
+        Args:
+            content: YAML 内容（str / bytes / 文件对象）
+            
+        Returns:
+            PolicyModel 对象
+            
+        Raises:
+            ValueError: YAML 格式错误或策略内容不合法
+        """
+        try:
+            data = yaml.load(content, Loader=_YAMLLoader)
+        except yaml.YAMLError as e:
+            raise ValueError(f"Invalid YAML format: {e}")
         
         if not data:
             raise ValueError("Empty policy file")
@@ -86,7 +229,8 @@ class PolicyEngine:
         """解析 ACL 列表"""
         access_lists = []
         
-        for acl in acl_data:
+        for i, acl in enumerate(acl_data):
+            _require_fields(acl, ('name',), f"access_lists[{i}]")
             acl_type = ACLType.IPV4 if acl.get('type', 'ipv4') == 'ipv4' else ACLType.IPV6
             access_list = AccessList(
                 name=acl['name'],
@@ -94,7 +238,8 @@ class PolicyEngine:
             )
             
             # 解析规则
-            for rule_data in acl.get('rules', []):
+            for j, rule_data in enumerate(acl.get('rules', [])):
+                _require_fields(rule_data, _ACL_RULE_FIELDS, f"access_lists[{i}].rules[{j}]")
                 rule = ACLRule(
                     sequence=rule_data['sequence'],
                     action=rule_data['action'],
@@ -106,6 +251,9 @@ class PolicyEngine:
                 )
                 access_list.add_rule(rule)
             
+            # 全部规则加载后统一排序一次
+            access_list.sort_rules()
+            
             access_lists.append(access_list)
         
         return access_lists
@@ -114,7 +262,13 @@ class PolicyEngine:
         """解析 class-map 列表"""
         class_maps = []
         
-        for cm in cm_data:
+        for i, cm in enumerate(cm_data):
+            _require_fields(cm, ('name',), f"class_maps[{i}]")
+            for j, condition in enumerate(cm.get('conditions', [])):
+                where = f"class_maps[{i}].conditions[{j}]"
+                _require_fields(condition, ('type',), where)
+                _require_fields(condition, _CONDITION_FIELDS.get(condition['type'], ()), where)
+            
             class_map = ClassMap(
                 name=cm['name'],
                 match_type=cm.get('match_type', 'match-any'),
@@ -128,11 +282,18 @@ class PolicyEngine:
         """解析 policy-map 列表"""
         policy_maps = []
         
-        for pm in pm_data:
+        for i, pm in enumerate(pm_data):
+            _require_fields(pm, ('name',), f"policy_maps[{i}]")
             policy_map = PolicyMap(name=pm['name'])
             
             # 解析 class 配置
-            for cls in pm.get('classes', []):
+            for j, cls in enumerate(pm.get('classes', [])):
+                _require_fields(cls, ('class_name',), f"policy_maps[{i}].classes[{j}]")
+                for k, action in enumerate(cls.get('actions', [])):
+                    where = f"policy_maps[{i}].classes[{j}].actions[{k}]"
+                    _require_fields(action, ('type',), where)
+                    _require_fields(action, _ACTION_FIELDS.get(action['type'], ()), where)
+                
                 pm_class = PolicyMapClass(
                     class_name=cls['class_name'],
                     actions=cls.get('actions', [])
@@ -147,7 +308,8 @@ class PolicyEngine:
         """解析 service-policy 列表"""
         service_policies = []
         
-        for sp in sp_data:
+        for i, sp in enumerate(sp_data):
+            _require_fields(sp, _SERVICE_POLICY_FIELDS, f"service_policies[{i}]")
             service_policy = ServicePolicy(
                 interface=sp['interface'],
                 direction=sp['direction'],
@@ -167,98 +329,102 @@ class PolicyEngine:
         Returns:
             (是否通过, 错误列表)
         """
-        self.validation_errors = []
+        # 错误列表为局部变量，共享的引擎实例可被并发调用
+        errors: List[ValidationError] = []
+        
+        # 各类名称集合只构建一次，供引用检查共用
+        acl_names = {acl.name for acl in policy.access_lists}
+        class_names = {cm.name for cm in policy.class_maps}
+        policy_names = {pm.name for pm in policy.policy_maps}
         
         # 验证 ACL 规则
-        self._validate_access_lists(policy)
+        self._validate_access_lists(policy, errors)
         
         # 验证 class-map 引用
-        self._validate_class_maps(policy)
+        self._validate_class_maps(policy, errors, acl_names)
         
         # 验证 policy-map 引用
-        self._validate_policy_maps(policy)
-        
-        # 验证 service-policy 引用
-        self._validate_service_policies(policy)
+        self._validate_policy_maps(policy, errors, class_names)
         
-        # 验证接口名称
-        self._validate_interfaces(policy)
+        # 验证 service-policy 引用与接口名称
+        self._validate_service_policies(policy, errors, policy_names)
         
-        is_valid = len([e for e in self.validation_errors if e.severity == "error"]) == 0
+        self.validation_errors = errors
+        is_valid = not any(e.severity == "error" for e in errors)
         
-        return is_valid, self.validation_errors
+        return is_valid, errors
     
-    def _validate_access_lists(self, policy: PolicyModel):
+    def _validate_access_lists(self, policy: PolicyModel, errors: List[ValidationError]):
         """验证 ACL"""
         for acl in policy.access_lists:
             if not acl.rules:
-                self.validation_errors.append(
+                errors.append(
                     ValidationError('access_lists', f"ACL '{acl.name}' has no rules")
                 )
             
             # 检查序号重复
-            sequences = [r.sequence for r in acl.rules]
-            if len(sequences) != len(set(sequences)):
-                self.validation_errors.append(
-                    ValidationError('access_lists', f"ACL '{acl.name}' has duplicate sequence numbers")
+            sequence_counts = Counter(r.sequence for r in acl.rules)
+            duplicates = sorted(seq for seq, count in sequence_counts.items() if count > 1)
+            if duplicates:
+                errors.append(
+                    ValidationError('access_lists',
+                        f"ACL '{acl.name}' has duplicate sequence numbers: "
+                        f"{', '.join(map(str, duplicates))}")
                 )
     
-    def _validate_class_maps(self, policy: PolicyModel):
+    def _validate_class_maps(self, policy: PolicyModel, errors: List[ValidationError],
+                             acl_names: Set[str]):
         """验证 class-map"""
-        acl_names = {acl.name for acl in policy.access_lists}
-        
         for cm in policy.class_maps:
             for condition in cm.conditions:
                 if condition.get('type') == 'access-group':
                     acl_name = condition.get('name')
                     if acl_name not in acl_names:
-                        self.validation_errors.append(
+                        errors.append(
                             ValidationError('class_maps', 
                                 f"Class-map '{cm.name}' references non-existent ACL '{acl_name}'")
                         )
     
-    def _validate_policy_maps(self, policy: PolicyModel):
+    def _validate_policy_maps(self, policy: PolicyModel, errors: List[ValidationError],
+                              class_names: Set[str]):
         """验证 policy-map"""
-        class_names = {cm.name for cm in policy.class_maps}
-        
         for pm in policy.policy_maps:
             if not pm.classes:
-                self.validation_errors.append(
+                errors.append(
                     ValidationError('policy_maps', f"Policy-map '{pm.name}' has no classes", "warning")
                 )
             
             for cls in pm.classes:
                 if cls.class_name not in class_names and cls.class_name != 'class-default':
-                    self.validation_errors.append(
+                    errors.append(
                         ValidationError('policy_maps',
                             f"Policy-map '{pm.name}' references non-existent class '{cls.class_name}'")
                     )
     
-    def _validate_service_policies(self, policy: PolicyModel):
-        """验证 service-policy"""
-        policy_names = {pm.name for pm in policy.policy_maps}
+    def _validate_service_policies(self, policy: PolicyModel, errors: List[ValidationError],
+                                   policy_names: Set[str]):
+        """验证 service-policy（引用检查与接口名称格式检查合并为一次遍历）"""
+        # 接口格式警告排在引用错误之后，保持原有输出顺序
+        warnings: List[ValidationError] = []
         
         for sp in policy.service_policies:
             if sp.policy_map not in policy_names:
-                self.validation_errors.append(
+                errors.append(
                     ValidationError('service_policies',
                         f"Service-policy references non-existent policy-map '{sp.policy_map}'")
                 )
-    
-    def _validate_interfaces(self, policy: PolicyModel):
-        """验证接口名称格式"""
-        interface_pattern = re.compile(r'^(Ethernet|Vlan|port-channel)\d+(/\d+)?$', re.IGNORECASE)
-        
-        for sp in policy.service_policies:
-            if not interface_pattern.match(sp.interface):
-                self.validation_errors.append(
+            
+            if not _INTERFACE_RE.match(sp.interface):
+                warnings.append(
                     ValidationError('service_policies',
                         f"Invalid interface name format: '{sp.interface}'", "warning")
                 )
+        
+        errors.extend(warnings)
     
     def generate_commands(self, policy: PolicyModel) -> List[str]:
         """
-        生成 NX-CLI 配置命令
+        生成 NX-CLI 配置命令（按策略内容指纹缓存）
         
         Args:
             policy: 策略模型
@@ -266,6 +432,53 @@ class PolicyEngine:
         Returns:
             命令列表（按执行顺序排列）
         """
+        return list(self._rendered(policy)[0])
+    
+    def count_commands(self, policy: PolicyModel) -> int:
+        """统计非空命令条数（随渲染结果缓存）"""
+        return self._rendered(policy)[2]
+    
+    def compile(self, policy: PolicyModel) -> Callable[[], List[str]]:
+        """
+        预渲染策略命令，返回可重复调用的命令生成函数
+        
+        命令只依赖策略内容，渲染一次后向多台设备下发时直接复用。
+        
+        Args:
+            policy: 策略模型
+            
+        Returns:
+            每次调用返回命令列表副本的函数
+        """
+        return partial(list, self._rendered(policy)[0])
+    
+    def _rendered(self, policy: PolicyModel) -> Tuple[Tuple[str, ...], str, int]:
+        """
+        获取渲染结果（按策略内容指纹缓存）
+        
+        Returns:
+            (命令元组, 换行拼接后的命令文本, 非空命令数)
+        """
+        key = policy.fingerprint()
+        
+        with self._cache_lock:
+            rendered = self._commands_cache.get(key)
+            if rendered is not None:
+                self._commands_cache.move_to_end(key)
+                return rendered
+        
+        commands = tuple(self._render_commands(policy))
+        rendered = (commands, "\n".join(commands), sum(1 for c in commands if c.strip()))
+        
+        with self._cache_lock:
+            self._commands_cache[key] = rendered
+            while len(self._commands_cache) > self._commands_cache_size:
+                self._commands_cache.popitem(last=False)
+        
+        return rendered
+    
+    def _render_commands(self, policy: PolicyModel) -> List[str]:
+        """按顺序生成各部分命令"""
         commands = []
         
         # 1. 生成 ACL 命令
@@ -290,33 +503,32 @@ class PolicyEngine:
             # ACL 头部
             commands.append(f"ip access-list {acl.name}")
             
-            # 规则
+            # 规则（先收集各部分，最后一次 join）
             for rule in acl.rules:
-                cmd = f"  {rule.sequence} {rule.action} {rule.protocol}"
-                cmd += f" {rule.source}"
+                parts = [f"  {rule.sequence}", rule.action, rule.protocol, str(rule.source)]
                 
                 # 源端口
                 if rule.source_port:
                     if len(rule.source_port) == 1:
-                        cmd += f" eq {rule.source_port[0]}"
+                        parts += ("eq", str(rule.source_port[0]))
                     else:
-                        cmd += f" range {rule.source_port[0]} {rule.source_port[1]}"
+                        parts += ("range", str(rule.source_port[0]), str(rule.source_port[1]))
                 
-                cmd += f" {rule.destination}"
+                parts.append(str(rule.destination))
                 
                 # 目的端口
                 if rule.dest_port:
                     if len(rule.dest_port) == 1:
-                        cmd += f" eq {rule.dest_port[0]}"
+                        parts += ("eq", str(rule.dest_port[0]))
                     elif len(rule.dest_port) == 2:
-                        cmd += f" range {rule.dest_port[0]} {rule.dest_port[1]}"
+                        parts += ("range", str(rule.dest_port[0]), str(rule.dest_port[1]))
                     else:
-                        # 多个独立端口
-                        for port in rule.dest_port:
-                            commands.append(cmd + f" eq {port}")
+                        # 多个独立端口：公共前缀只拼接一次
+                        prefix = " ".join(parts)
+                        commands.extend(f"{prefix} eq {port}" for port in rule.dest_port)
                         continue
                 
-                commands.append(cmd)
+                commands.append(" ".join(parts))
             
             commands.append("")  # 空行分隔
         
@@ -330,12 +542,9 @@ class PolicyEngine:
             commands.append(f"class-map {cm.match_type} {cm.name}")
             
             for condition in cm.conditions:
-                if condition['type'] == 'access-group':
-                    commands.append(f"  match access-group name {condition['name']}")
-                elif condition['type'] == 'dscp':
-                    commands.append(f"  match dscp {condition['value']}")
-                elif condition['type'] == 'precedence':
-                    commands.append(f"  match precedence {condition['value']}")
+                template = _CONDITION_TEMPLATES.get(condition['type'])
+                if template is not None:
+                    commands.append(template.format_map(condition))
             
             commands.append("")
         
@@ -352,16 +561,10 @@ class PolicyEngine:
                 commands.append(f"  class {cls.class_name}")
                 
                 for action in cls.actions:
-                    if action['type'] == 'set':
-                        param = action['parameter']
-                        value = action['value']
-                        commands.append(f"    set {param} {value}")
-                    elif action['type'] == 'police':
-                        rate = action.get('rate', '10m')
-                        commands.append(f"    police cir {rate}")
-                    elif action['type'] == 'bandwidth':
-                        bw = action.get('value', '10')
-                        commands.append(f"    bandwidth {bw}")
+                    entry = _ACTION_TEMPLATES.get(action['type'])
+                    if entry is not None:
+                        template, defaults = entry
+                        commands.append(template.format_map({**defaults, **action}))
             
             commands.append("")
         
@@ -372,9 +575,11 @@ class PolicyEngine:
         commands = []
         
         for sp in service_policies:
-            commands.append(f"interface {sp.interface}")
-            commands.append(f"  service-policy {sp.direction} {sp.policy_map}")
-            commands.append("")
+            commands += (
+                f"interface {sp.interface}",
+                f"  service-policy {sp.direction} {sp.policy_map}",
+                "",
+            )
         
         return commands
     
@@ -388,12 +593,16 @@ class PolicyEngine:
         Returns:
             格式化的命令字符串
         """
-        commands = self.generate_commands(policy)
+        _, text, count = self._rendered(policy)
         
         output = f"# Policy: {policy.name}\n"
         output += f"# Description: {policy.description}\n"
-        output += f"# Total Commands: {len([c for c in commands if c.strip()])}\n"
+        output += f"# Total Commands: {count}\n"
         output += "# " + "=" * 70 + "\n\n"
-        output += "\n".join(commands)
+        output += text
         
         return output
+
+
+# 共享的策略引擎实例（引擎本身无请求级状态，可在各请求间复用）
+engine = PolicyEngine()
@@ -7,6 +7,18 @@ from dataclasses import dataclass, field
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from enum import Enum
+from operator import attrgetter
+import bisect
+import hashlib
+
+
+_rule_sequence = attrgetter('sequence')
+
+# 字段合法取值（frozenset 哈希查找）
+_VALID_ACTIONS = frozenset({'permit', 'deny'})
+_VALID_PROTOCOLS = frozenset({'tcp', 'udp', 'ip', 'icmp', 'any'})
+_VALID_MATCH_TYPES = frozenset({'match-any', 'match-all'})
+_VALID_DIRECTIONS = frozenset({'input', 'output'})
 
 
 class PolicyStatus(Enum):
@@ -24,7 +36,7 @@ class ACLType(Enum):
     IPV6 = "ipv6"
 
 
-@dataclass
+@dataclass(slots=True)
 class ACLRule:
     """ACL 规则"""
     sequence: int
@@ -37,13 +49,13 @@ class ACLRule:
     
     def __post_init__(self):
         """验证规则"""
-        if self.action not in ['permit', 'deny']:
+        if self.action not in _VALID_ACTIONS:
             raise ValueError(f"Invalid action: {self.action}")
-        if self.protocol not in ['tcp', 'udp', 'ip', 'icmp', 'any']:
+        if self.protocol not in _VALID_PROTOCOLS:
             raise ValueError(f"Invalid protocol: {self.protocol}")
 
 
-@dataclass
+@dataclass(slots=True)
 class AccessList:
     """访问控制列表"""
     name: str
@@ -51,13 +63,23 @@ class AccessList:
     rules: List[ACLRule] = field(default_factory=list)
     
     def add_rule(self, rule: ACLRule):
-        """添加规则"""
+        """添加规则（不排序，批量添加后调用 sort_rules）"""
         self.rules.append(rule)
-        # 按 sequence 排序
-        self.rules.sort(key=lambda r: r.sequence)
+    
+    def sort_rules(self):
+        """按 sequence 排序规则"""
+        self.rules.sort(key=_rule_sequence)
+    
+    def insort_rule(self, rule: ACLRule):
+        """
+        按 sequence 有序插入单条规则
+        
+        对已属于某个 PolicyModel 的 ACL 调用后，需调用该策略的 invalidate()。
+        """
+        bisect.insort(self.rules, rule, key=_rule_sequence)
 
 
-@dataclass
+@dataclass(slots=True)
 class ClassMap:
     """流分类映射"""
     name: str
@@ -66,25 +88,25 @@ class ClassMap:
     
     def __post_init__(self):
         """验证匹配类型"""
-        if self.match_type not in ['match-any', 'match-all']:
+        if self.match_type not in _VALID_MATCH_TYPES:
             raise ValueError(f"Invalid match_type: {self.match_type}")
 
 
-@dataclass
+@dataclass(slots=True)
 class PolicyMapClass:
     """策略映射中的类配置"""
     class_name: str
     actions: List[Dict[str, Any]] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class PolicyMap:
     """策略映射"""
     name: str
     classes: List[PolicyMapClass] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class ServicePolicy:
     """服务策略（接口应用）"""
     interface: str
@@ -93,11 +115,11 @@ class ServicePolicy:
     
     def __post_init__(self):
         """验证方向"""
-        if self.direction not in ['input', 'output']:
+        if self.direction not in _VALID_DIRECTIONS:
             raise ValueError(f"Invalid direction: {self.direction}")
 
 
-@dataclass
+@dataclass(slots=True)
 class PolicyModel:
     """完整的 QoS 策略模型"""
     id: str
@@ -113,8 +135,37 @@ class PolicyModel:
     updated_at: datetime = field(default_factory=datetime.now)
     status: PolicyStatus = PolicyStatus.PENDING
     
+    # to_dict / fingerprint 结果缓存（任何字段被重新赋值时清空）
+    # 注意：策略解析完成后按不可变对象使用；就地修改嵌套内容（如 ACL 规则、
+    # class-map 条件或列表元素）不会被检测到，修改后必须调用 invalidate()，
+    # 否则 fingerprint() 与按指纹缓存的生成命令会保持旧值
+    _dict_cache: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
+    _fingerprint: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    
+    def __setattr__(self, name, value):
+        if name not in ('_dict_cache', '_fingerprint'):
+            self.invalidate()
+        object.__setattr__(self, name, value)
+    
+    def invalidate(self):
+        """清空 to_dict / fingerprint 缓存（就地修改嵌套内容后调用）"""
+        object.__setattr__(self, '_dict_cache', None)
+        object.__setattr__(self, '_fingerprint', None)
+    
+    def fingerprint(self) -> str:
+        """策略内容指纹（仅覆盖影响生成命令的字段）"""
+        if self._fingerprint is None:
+            content = repr((self.access_lists, self.class_maps, self.policy_maps, self.service_policies))
+            self._fingerprint = hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+        return self._fingerprint
+    
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典（用于序列化）"""
+        if self._dict_cache is None:
+            self._dict_cache = self._build_dict()
+        return self._dict_cache
+    
+    def _build_dict(self) -> Dict[str, Any]:
         return {
             'id': self.id,
             'name': self.name,
@@ -129,16 +180,17 @@ class PolicyModel:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class CommandResult:
     """单条命令执行结果"""
     command: str
     success: bool
     output: Optional[str] = None
     error: Optional[str] = None
+    sent: bool = True  # 前面的批次失败后未下发的命令为 False
 
 
-@dataclass
+@dataclass(slots=True)
 class ExecutionResult:
     """策略执行结果"""
     policy_id: str
@@ -150,9 +202,23 @@ class ExecutionResult:
     executed_at: datetime = field(default_factory=datetime.now)
     duration_ms: int = 0
     dry_run: bool = False
+    unreachable: bool = False  # 连接阶段失败（连接被拒 / 连接超时，请求未送达设备）
+    
+    # to_dict 结果缓存（字段被重新赋值或 add_error 时清空）
+    _dict_cache: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
+    
+    def __setattr__(self, name, value):
+        if name != '_dict_cache':
+            object.__setattr__(self, '_dict_cache', None)
+        object.__setattr__(self, name, value)
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
+        if self._dict_cache is None:
+            self._dict_cache = self._build_dict()
+        return self._dict_cache
+    
+    def _build_dict(self) -> Dict[str, Any]:
         return {
             'policy_id': self.policy_id,
             'success': self.success,
@@ -171,10 +237,11 @@ class ExecutionResult:
     def add_error(self, error: str):
         """添加错误"""
         self.errors.append(error)
+        # 赋值 success 同时清空 to_dict 缓存
         self.success = False
 
 
-@dataclass
+@dataclass(slots=True)
 class ValidationError:
     """验证错误"""
     field: str
@@ -133,7 +133,10 @@ async function handleFormSubmit(event) {
         } else {
             // 处理验证错误
             if (data.validation_errors) {
-                const errorList = data.validation_errors.map(e => `  • ${e}`).join('<br>');
+                let errorList = data.validation_errors.map(e => `  • ${e}`).join('<br>');
+                if (data.validation_errors_truncated) {
+                    errorList += '<br>  • ...';
+                }
                 showError(`策略验证失败：<br><br>${errorList}`);
             } else {
                 showError(data.error || '上传失败');
@@ -1,31 +1,64 @@
 """测试 Flask 应用是否正常运行"""
 import requests
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-# 等待应用启动
-time.sleep(2)
+BASE_URL = 'http://localhost:5000'
+
+# 共用会话，复用 keep-alive 连接
+session = requests.Session()
+
+# 等待应用启动：轮询健康检查（指数退避，最多约 5 秒）
+response = None
+delay = 0.05
+deadline = time.monotonic() + 5
+while True:
+    try:
+        response = session.get(f'{BASE_URL}/api/health', timeout=0.5)
+        if response.ok:
+            break
+    except requests.RequestException:
+        pass
+    if time.monotonic() >= deadline:
+        break
+    time.sleep(delay)
+    delay = min(delay * 2, 1)
 
 # 测试健康检查
 try:
-    response = requests.get('http://localhost:5000/api/health')
+    if response is None:
+        response = session.get(f'{BASE_URL}/api/health')
     print(f"Status Code: {response.status_code}")
     print(f"Response: {response.json()}")
     print("\n✅ 应用运行正常！")
 except Exception as e:
     print(f"❌ 连接失败: {e}")
 
+
+def fetch(path):
+    """请求端点，返回 (JSON, 异常)"""
+    try:
+        return session.get(f'{BASE_URL}{path}').json(), None
+    except Exception as e:
+        return None, e
+
+
+# 配置端点与策略列表并发请求
+with ThreadPoolExecutor(max_workers=2) as executor:
+    config_result, policies_result = executor.map(fetch, ['/api/config', '/api/policies'])
+
 # 测试配置端点
-try:
-    response = requests.get('http://localhost:5000/api/config')
+data, error = config_result
+if error is None:
     print(f"\n配置信息:")
-    print(response.json())
-except Exception as e:
-    print(f"配置端点失败: {e}")
+    print(data)
+else:
+    print(f"配置端点失败: {error}")
 
 # 测试策略列表
-try:
-    response = requests.get('http://localhost:5000/api/policies')
+data, error = policies_result
+if error is None:
     print(f"\n策略列表:")
-    print(response.json())
-except Exception as e:
-    print(f"策略列表失败: {e}")
+    print(data)
+else:
+    print(f"策略列表失败: {error}")
@@ -0,0 +1,111 @@
+"""core.async_deployer 单元测试（不连接真实设备）"""
+
+import unittest
+from unittest import mock
+
+import aiohttp
+
+from core.async_deployer import AsyncNXAPIClient, deploy_many_sync
+
+
+COMMANDS = [
+    'ip access-list A', '  10 permit ip any any',
+    'ip access-list B', '  10 BAD',
+    'ip access-list C', '  10 permit ip any any',
+]
+
+
+def _reply(payload):
+    """按命令内容生成 JSON-RPC 响应：含 BAD 的命令返回错误"""
+    items = []
+    for item in payload:
+        if 'BAD' in item['params']['cmd']:
+            items.append({'jsonrpc': '2.0', 'id': item['id'],
+                          'error': {'message': 'bad command', 'data': {}}})
+        else:
+            items.append({'jsonrpc': '2.0', 'id': item['id'], 'result': None})
+    return items
+
+
+class _FakeClient(AsyncNXAPIClient):
+    """以协程替换 _send_request 的客户端"""
+    
+    def __init__(self, fail_after=None):
+        super().__init__('127.0.0.1', 'user', 'pass')
+        self.payloads = []
+        self.fail_after = fail_after
+    
+    async def _send_request(self, payload):
+        if self.fail_after is not None and len(self.payloads) >= self.fail_after:
+            raise aiohttp.ServerDisconnectedError()
+        self.payloads.append(payload)
+        return _reply(payload)
+
+
+class ExecuteCommandsTest(unittest.IsolatedAsyncioTestCase):
+    """分批下发结果"""
+    
+    async def test_later_batch_failure_keeps_applied_batches(self):
+        client = _FakeClient()
+        result = await client.execute_commands(COMMANDS, batch_size=2)
+        
+        self.assertEqual(len(client.payloads), 2)
+        self.assertFalse(result.success)
+        self.assertIn('partially applied: 3 of 6', result.message)
+        self.assertEqual(
+            [(r.success, r.sent) for r in result.command_results],
+            [(True, True), (True, True), (True, True),
+             (False, True), (False, False), (False, False)]
+        )
+    
+    async def test_connection_error_after_first_batch_is_partial_not_unreachable(self):
+        client = _FakeClient(fail_after=1)
+        result = await client.execute_commands(COMMANDS[:2] + COMMANDS[4:] * 2, batch_size=2)
+        
+        self.assertFalse(result.success)
+        self.assertFalse(result.unreachable)
+        self.assertIn('Connection error', result.message)
+        self.assertIn('partially applied: 2 of 6', result.message)
+        self.assertEqual([r.sent for r in result.command_results],
+                         [True, True, True, True, False, False])
+    
+    async def test_success(self):
+        client = _FakeClient()
+        result = await client.execute_commands(COMMANDS[:2] + COMMANDS[4:], batch_size=2)
+        
+        self.assertTrue(result.success)
+        self.assertTrue(all(r.success for r in result.command_results))
+
+
+class DeployManySyncTest(unittest.TestCase):
+    """多设备共享会话下发"""
+    
+    def test_devices_share_session_with_per_device_auth(self):
+        calls = []
+        
+        async def send(client, payload):
+            calls.append((client.host, client._get_session(), client._owns_session,
+                          client._headers['Authorization']))
+            return _reply(payload)
+        
+        switches = [
+            {'host': '10.0.0.1', 'username': 'alice', 'password': 'a'},
+            {'host': '10.0.0.2', 'username': 'bob', 'password': 'b'},
+        ]
+        with mock.patch.object(AsyncNXAPIClient, '_send_request', send):
+            results = deploy_many_sync(switches, COMMANDS[:2])
+        
+        self.assertTrue(all(r.success for r in results))
+        self.assertEqual(sorted(host for host, *_ in calls), ['10.0.0.1', '10.0.0.2'])
+        self.assertEqual(len({id(session) for _, session, _, _ in calls}), 1)
+        self.assertFalse(any(owns for _, _, owns, _ in calls))
+        self.assertTrue(calls[0][1].closed)
+        self.assertEqual(
+            {host: auth for host, _, _, auth in calls},
+            {'10.0.0.1': aiohttp.encode_basic_auth('alice', 'a'),
+             '10.0.0.2': aiohttp.encode_basic_auth('bob', 'b')}
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
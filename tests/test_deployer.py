@@ -0,0 +1,197 @@
+"""core.deployer 单元测试（不连接真实设备）"""
+
+import unittest
+
+import orjson
+
+from core.deployer import NXAPIClient, dedupe_command_groups, nxos_include_pattern
+
+
+class _FakeResponse:
+    """只提供 _parse_response 需要的 content 属性"""
+    
+    def __init__(self, data):
+        self.content = orjson.dumps(data)
+
+
+class _FakeClient(NXAPIClient):
+    """按命令内容返回结果的客户端：含 BAD 的命令返回错误"""
+    
+    def __init__(self):
+        super().__init__('127.0.0.1', 'user', 'pass')
+        self.payloads = []
+    
+    def _send_request(self, payload):
+        self.payloads.append(payload)
+        items = []
+        for item in payload:
+            if 'BAD' in item['params']['cmd']:
+                items.append({'jsonrpc': '2.0', 'id': item['id'],
+                              'error': {'message': 'bad command', 'data': {}}})
+            else:
+                items.append({'jsonrpc': '2.0', 'id': item['id'], 'result': None})
+        return _FakeResponse(items)
+
+
+COMMANDS = [
+    'ip access-list A', '  10 permit ip any any',
+    'ip access-list B', '  10 BAD',
+    'ip access-list C', '  10 permit ip any any',
+]
+
+
+class ExecuteCommandsTest(unittest.TestCase):
+    """分批下发结果"""
+    
+    def test_later_batch_failure_keeps_applied_batches(self):
+        client = _FakeClient()
+        result = client.execute_commands(COMMANDS, batch_size=2)
+        
+        self.assertEqual(len(client.payloads), 2)
+        self.assertFalse(result.success)
+        self.assertIn('partially applied: 3 of 6', result.message)
+        self.assertEqual(
+            [(r.success, r.sent) for r in result.command_results],
+            [(True, True), (True, True), (True, True),
+             (False, True), (False, False), (False, False)]
+        )
+    
+    def test_request_error_after_first_batch_is_partial_not_unreachable(self):
+        import requests
+        
+        client = _FakeClient()
+        send = client._send_request
+        
+        def fail_second(payload):
+            if client.payloads:
+                raise requests.exceptions.ConnectionError('connection reset')
+            return send(payload)
+        
+        client._send_request = fail_second
+        result = client.execute_commands(COMMANDS[:2] + COMMANDS[4:] * 2, batch_size=2)
+        
+        self.assertFalse(result.success)
+        self.assertFalse(result.unreachable)
+        self.assertIn('partially applied: 2 of 6', result.message)
+        self.assertEqual([r.sent for r in result.command_results],
+                         [True, True, True, True, False, False])
+    
+    def test_success(self):
+        result = _FakeClient().execute_commands(COMMANDS[:2] + COMMANDS[4:], batch_size=2)
+        self.assertTrue(result.success)
+        self.assertTrue(all(r.success for r in result.command_results))
+    
+    def test_read_timeout_is_not_unreachable(self):
+        import requests
+        
+        client = _FakeClient()
+        
+        def timeout(payload):
+            raise requests.exceptions.ReadTimeout('read timed out')
+        
+        client._send_request = timeout
+        result = client.execute_commands(COMMANDS[:2])
+        
+        self.assertFalse(result.success)
+        self.assertFalse(result.unreachable)
+        self.assertIn('Request timeout', result.message)
+    
+    def test_connect_failure_is_unreachable(self):
+        import requests
+        from urllib3.exceptions import MaxRetryError, NewConnectionError
+        
+        client = _FakeClient()
+        
+        def refuse(payload):
+            reason = NewConnectionError(None, 'connection refused')
+            raise requests.exceptions.ConnectionError(MaxRetryError(None, '/ins', reason))
+        
+        client._send_request = refuse
+        result = client.execute_commands(COMMANDS[:2])
+        
+        self.assertFalse(result.success)
+        self.assertTrue(result.unreachable)
+
+
+def _policy(dscp):
+    return ['policy-map type qos P', '  class C', f'    set dscp {dscp}']
+
+
+class DedupeCommandGroupsTest(unittest.TestCase):
+    """多组命令合并下发时的去重"""
+    
+    def test_repeated_group_sends_nothing(self):
+        acl = ['ip access-list A', '  10 permit ip any any', '  20 deny ip any any']
+        group = acl + ['class-map match-any C', '  match access-group name A'] + _policy(46)
+        
+        self.assertEqual(dedupe_command_groups([group, group]), [group, []])
+    
+    def test_override_order_is_preserved(self):
+        deduped = dedupe_command_groups([_policy(46), _policy(10), _policy(46)])
+        
+        self.assertEqual(deduped, [_policy(46), _policy(10), _policy(46)])
+        sent = [cmd.strip() for group in deduped for cmd in group]
+        self.assertEqual([cmd for cmd in sent if cmd.startswith('set dscp')][-1], 'set dscp 46')
+    
+    def test_header_dropped_when_all_children_are_duplicates(self):
+        first = ['policy-map type qos P', '  class C', '    set dscp 46',
+                 '  class D', '    set dscp 10']
+        second = ['policy-map type qos P', '  class D', '    set dscp 10',
+                  '  class E', '    set dscp 0']
+        third = ['policy-map type qos P', '  class D', '    set dscp 10']
+        
+        self.assertEqual(
+            dedupe_command_groups([first, second, third]),
+            [first, ['policy-map type qos P', '  class E', '    set dscp 0'], []]
+        )
+    
+    def test_no_command_resets_records(self):
+        acl = ['ip access-list A', '  10 permit ip any any']
+        
+        self.assertEqual(
+            dedupe_command_groups([acl, ['no ip access-list A'], acl]),
+            [acl, ['no ip access-list A'], acl]
+        )
+    
+    def test_execute_command_groups_sends_deduped_commands(self):
+        client = _FakeClient()
+        result, grouped = client.execute_command_groups([_policy(46), _policy(46)])
+        
+        self.assertTrue(result.success)
+        self.assertEqual([item['params']['cmd'] for item in client.payloads[0]],
+                         [cmd.strip() for cmd in _policy(46)])
+        self.assertEqual([len(results) for results in grouped], [3, 0])
+
+
+class VerifyConfigurationTest(unittest.TestCase):
+    """运行配置校验"""
+    
+    def test_include_pattern_is_quoted_and_only_regex_escaped(self):
+        self.assertEqual(nxos_include_pattern('ip access-list video-acl'),
+                         '"ip access-list video-acl"')
+        self.assertEqual(nxos_include_pattern('  10 permit ip 10.0.0.0/8 any'),
+                         '"10 permit ip 10\\.0\\.0\\.0/8 any"')
+    
+    def test_lookup_error_is_unknown_not_absent(self):
+        client = _FakeClient()
+        result = client.verify_configuration(['ip access-list A', 'BAD'])
+        
+        self.assertEqual(client.payloads[0][0]['params']['cmd'],
+                         'show running-config | include "ip access-list A"')
+        self.assertEqual(result, {'ip access-list A': False, 'BAD': None})
+    
+    def test_transport_error_propagates(self):
+        import requests
+        
+        client = _FakeClient()
+        
+        def fail(payload):
+            raise requests.exceptions.ConnectionError('connection refused')
+        
+        client._send_request = fail
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client.verify_configuration(['ip access-list A'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+"""core.models 单元测试"""
+
+import unittest
+
+from core.engine import PolicyEngine
+from core.models import AccessList, ACLRule, ACLType, PolicyModel
+
+
+class PolicyFingerprintTest(unittest.TestCase):
+    """指纹缓存与就地修改"""
+    
+    def setUp(self):
+        self.acl = AccessList('ACL_A', ACLType.IPV4)
+        self.acl.add_rule(ACLRule(20, 'permit', 'ip', 'any', 'any'))
+        self.policy = PolicyModel('p', 'p', 'p', access_lists=[self.acl])
+        self.engine = PolicyEngine()
+    
+    def test_reassigning_field_refreshes_commands(self):
+        before = self.engine.generate_commands(self.policy)
+        self.policy.access_lists = [AccessList('ACL_B', ACLType.IPV4)]
+        self.assertNotEqual(self.engine.generate_commands(self.policy), before)
+    
+    def test_invalidate_after_in_place_change(self):
+        self.engine.generate_commands(self.policy)
+        self.acl.insort_rule(ACLRule(10, 'deny', 'tcp', 'any', 'any'))
+        self.policy.invalidate()
+        
+        commands = self.engine.generate_commands(self.policy)
+        self.assertEqual(commands[1:3], ['  10 deny tcp any any', '  20 permit ip any any'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,11 +4,25 @@ Logger - Unified logging system
 """
 
 import logging
+import logging.handlers
 import sys
+import threading
 from pathlib import Path
 from datetime import datetime
 from typing import Optional
-import json
+
+import orjson
+
+
+# 日志文件轮转大小与保留份数
+LOG_MAX_BYTES = 50 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+# 应用日志缓冲条数与最长缓冲秒数（遇到 WARNING 及以上级别立即刷新）
+LOG_BUFFER_CAPACITY = 20
+LOG_FLUSH_INTERVAL = 5
+
+# 通过 extra 传入、需要写入 JSON 日志的字段
+_EXTRA_FIELDS = ('policy_id', 'uploaded_filename', 'duration_ms')
 
 
 class JSONFormatter(logging.Formatter):
@@ -17,7 +31,8 @@ class JSONFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
         """格式化日志为 JSON"""
         log_data = {
-            'timestamp': datetime.fromtimestamp(record.created).isoformat(),
+            # datetime 由 orjson 直接序列化，输出与 isoformat() 相同
+            'timestamp': datetime.fromtimestamp(record.created),
             'level': record.levelname,
             'logger': record.name,
             'message': record.getMessage(),
@@ -27,19 +42,45 @@ class JSONFormatter(logging.Formatter):
         }
         
         # 添加额外字段
-        if hasattr(record, 'policy_id'):
-            log_data['policy_id'] = record.policy_id
-        
-        if hasattr(record, 'uploaded_filename'):
-            log_data['uploaded_filename'] = record.uploaded_filename
-        
-        if hasattr(record, 'duration_ms'):
-            log_data['duration_ms'] = record.duration_ms
+        attrs = record.__dict__
+        for key in _EXTRA_FIELDS:
+            if key in attrs:
+                log_data[key] = attrs[key]
         
         if record.exc_info:
             log_data['exception'] = self.formatException(record.exc_info)
         
-        return json.dumps(log_data, ensure_ascii=False)
+        # orjson 直接输出 UTF-8（等价于 ensure_ascii=False）
+        return orjson.dumps(log_data, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+class TimedMemoryHandler(logging.handlers.MemoryHandler):
+    """带时间上限的缓冲处理器：首条日志进入缓冲后 flush_interval 秒内必定刷新（空闲时也会刷新）"""
+    
+    def __init__(self, capacity: int, flush_interval: float, **kwargs):
+        super().__init__(capacity, **kwargs)
+        self.flush_interval = flush_interval
+        self._timer: Optional[threading.Timer] = None
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        """写入缓冲；缓冲非空且没有待执行的定时刷新时启动后台定时器"""
+        super().emit(record)
+        # fork 后子进程中的定时器线程不存在，需重新启动
+        if self.buffer and (self._timer is None or not self._timer.is_alive()):
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+    
+    def flush(self) -> None:
+        """刷新缓冲并取消待执行的定时刷新"""
+        self.acquire()
+        try:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            super().flush()
+        finally:
+            self.release()
 
 
 class ColoredFormatter(logging.Formatter):
@@ -55,11 +96,21 @@ class ColoredFormatter(logging.Formatter):
     }
     RESET = '\033[0m'
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 预先拼好带颜色的级别名
+        self._colored = {
+            level: f"{color}{level}{self.RESET}" for level, color in self.COLORS.items()
+        }
+    
     def format(self, record: logging.LogRecord) -> str:
-        """格式化带颜色的日志"""
-        color = self.COLORS.get(record.levelname, self.RESET)
-        record.levelname = f"{color}{record.levelname}{self.RESET}"
-        return super().format(record)
+        """格式化带颜色的日志（格式化后恢复 levelname，避免影响其他 handler）"""
+        levelname = record.levelname
+        record.levelname = self._colored.get(levelname, levelname)
+        try:
+            return super().format(record)
+        finally:
+            record.levelname = levelname
 
 
 def setup_logger(
@@ -118,12 +169,19 @@ def setup_logger(
         log_dir = Path(log_dir)
         log_dir.mkdir(parents=True, exist_ok=True)
         
-        # 应用日志
+        # 应用日志（按大小轮转，缓冲写入减少 write 调用）
         app_log_file = log_dir / 'app.log'
-        file_handler = logging.FileHandler(app_log_file, encoding='utf-8')
+        file_handler = logging.handlers.RotatingFileHandler(
+            app_log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
         file_handler.setLevel(level)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        buffered_handler = TimedMemoryHandler(
+            LOG_BUFFER_CAPACITY, LOG_FLUSH_INTERVAL,
+            flushLevel=logging.WARNING, target=file_handler
+        )
+        buffered_handler.setLevel(level)
+        logger.addHandler(buffered_handler)
         
         # 操作日志（按日期分割）
         operations_dir = log_dir / 'operations'
@@ -131,7 +189,10 @@ def setup_logger(
         
         today = datetime.now().strftime('%Y-%m-%d')
         operation_log_file = operations_dir / f'{today}.log'
-        operation_handler = logging.FileHandler(operation_log_file, encoding='utf-8')
+        # 操作日志不缓冲：日志页面需要立即看到最新操作
+        operation_handler = logging.handlers.RotatingFileHandler(
+            operation_log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
         operation_handler.setLevel(logging.INFO)
         
         # 操作日志使用 JSON 格式
@@ -168,6 +229,9 @@ class OperationLogger:
     
     def log_upload(self, policy_id: str, filename: str, success: bool, error: Optional[str] = None):
         """记录策略上传"""
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        
         self.logger.info(
             f"Policy upload: {policy_id}",
             extra={
@@ -182,6 +246,9 @@ class OperationLogger:
     def log_apply(self, policy_id: str, dry_run: bool, success: bool, 
                   duration_ms: int, commands_count: int, error: Optional[str] = None):
         """记录策略应用"""
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        
         self.logger.info(
             f"Policy apply: {policy_id} ({'dry-run' if dry_run else 'execute'})",
             extra={
@@ -197,6 +264,9 @@ class OperationLogger:
     
     def log_validation(self, policy_id: str, success: bool, errors_count: int):
         """记录策略验证"""
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        
         self.logger.info(
             f"Policy validation: {policy_id}",
             extra={
@@ -209,6 +279,9 @@ class OperationLogger:
     
     def log_error(self, operation: str, error: str, policy_id: Optional[str] = None):
         """记录错误"""
+        if not self.logger.isEnabledFor(logging.ERROR):
+            return
+        
         self.logger.error(
             f"Error in {operation}: {error}",
             extra={
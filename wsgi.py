@@ -0,0 +1,14 @@
+"""
+WSGI 入口 - 供 gunicorn + gevent 部署使用
+WSGI entrypoint for gunicorn with gevent workers
+
+必须在导入 Flask / requests 之前打补丁，使 NX-API 的阻塞 I/O 变为协作式协程 I/O。
+"""
+
+from gevent import monkey
+
+monkey.patch_all()
+
+from app import app  # noqa: E402
+
+application = app